@@ -0,0 +1,99 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+
+class AnswerCache:
+    """LRU/TTL cache of chat answers keyed by the normalized question
+
+    Entries are tied to the matcher's corpus version: the first lookup made
+    with a newer version drops everything cached against the old corpus.
+    """
+
+    def __init__(self, max_entries=Config.ANSWER_CACHE_SIZE,
+                 max_bytes=Config.ANSWER_CACHE_MAX_BYTES,
+                 ttl=Config.ANSWER_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = None
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version):
+        size = self._estimate_size(key) + self._estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.current_bytes += size
+
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'version': self.version
+            }
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.version = version
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def _estimate_size(self, value):
+        """Approximate memory held by a cached key or value"""
+        if isinstance(value, dict):
+            return sys.getsizeof(value) + sum(
+                self._estimate_size(k) + self._estimate_size(v) for k, v in value.items()
+            )
+        if isinstance(value, (list, tuple)):
+            return sys.getsizeof(value) + sum(self._estimate_size(v) for v in value)
+        return sys.getsizeof(value)
@@ -1,23 +1,37 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, url_for
 from database import Database
-from models.nlp_model import FAQMatcher
+from config import Config
+from models.nlp_model import MATCH_METHODS, FAQMatcher
+from history_writer import ChatHistoryWriter
+from history_rollup import CONFIDENCE_BUCKETS, ChatHistoryRollup
+from answer_cache import AnswerCache
+import metrics
+from datetime import datetime, timezone
+import atexit
+import base64
+import gzip
 import json
 import re
+import time
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
 
 app = Flask(__name__)
 db = Database()
-faq_matcher = FAQMatcher(db)
-
-# Train the model on startup
-faq_matcher.fit()
+history_writer = ChatHistoryWriter(db)
+atexit.register(history_writer.close)
+history_rollup = ChatHistoryRollup(db)
+atexit.register(history_rollup.close)
+answer_cache = AnswerCache()
 
-def simplify_text(text):
-    """Simplify text for better readability"""
-    # Remove excessive whitespace
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Simplify complex sentences
-    replacements = {
+# Patterns used by the formatters, compiled once at import
+WHITESPACE_PATTERN = re.compile(r'\s+')
+SIMPLIFICATIONS = [
+    (re.compile(pattern, re.IGNORECASE), replacement)
+    for pattern, replacement in {
         r'is a leading and fast growing degree granting institution': 'is a leading institution offering degree programs',
         r'provide quality technical, vocational and technopreneurial education': 'provide quality technical and vocational education',
         r'Beacon in technical and manufacturing technology education': 'Leading institution in technical and manufacturing education',
@@ -26,10 +40,26 @@ def simplify_text(text):
         r'Create a strong password that includes': 'Create a strong password with',
         r'All requirements of HND': 'All HND requirements',
         r'Journeyman class 1 certificate': 'Journeyman Class 1 certificate'
-    }
+    }.items()
+]
+BULLET_PATTERN = re.compile(r'[•]\s*')
+NUMBERED_ITEM_PATTERN = re.compile(r'(\d+)\.\s+')
+SUBPOINT_PATTERN = re.compile(r'o\s+')
+TRAILING_COLON_PATTERN = re.compile(r':$')
+UPPER_HEADING_PATTERN = re.compile(r'^[A-Z][A-Z\s]+:$')
+TITLE_HEADING_PATTERN = re.compile(r'^[A-Z][a-zA-Z\s]+:$')
+NUMBERED_SECTION_PATTERN = re.compile(r'^\d+\.\d+\s+.+:')
+DOUBLE_PARAGRAPH_PATTERN = re.compile(r'</p>\s*<p>')
+STEP_PATTERN = re.compile(r'<p>(\d+)\.\s+(.+?)</p>')
+
+def simplify_text(text):
+    """Simplify text for better readability"""
+    # Remove excessive whitespace
+    text = WHITESPACE_PATTERN.sub(' ', text)
     
-    for pattern, replacement in replacements.items():
-        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+    # Simplify complex sentences
+    for pattern, replacement in SIMPLIFICATIONS:
+        text = pattern.sub(replacement, text)
     
     return text
 
@@ -70,9 +100,9 @@ def format_response(text):
     text = simplify_text(text)
     
     # Clean up bullet points and lists
-    text = re.sub(r'[•]\s*', '<li>', text)
-    text = re.sub(r'(\d+)\.\s+', r'<li>', text)  # Numbered lists become bullet points
-    text = re.sub(r'o\s+', '<li>', text)  # Subpoints
+    text = BULLET_PATTERN.sub('<li>', text)
+    text = NUMBERED_ITEM_PATTERN.sub(r'<li>', text)  # Numbered lists become bullet points
+    text = SUBPOINT_PATTERN.sub('<li>', text)  # Subpoints
     
     # Handle lists
     lines = text.split('\n')
@@ -91,7 +121,7 @@ def format_response(text):
                 in_list = True
             content = line[4:].strip()
             # Clean up content
-            content = re.sub(r':$', '', content)
+            content = TRAILING_COLON_PATTERN.sub('', content)
             formatted_lines.append(f'<li>{content}</li>')
         else:
             if in_list:
@@ -99,9 +129,9 @@ def format_response(text):
                 in_list = False
             
             # Handle headings
-            if re.match(r'^[A-Z][A-Z\s]+:$', line) or re.match(r'^[A-Z][a-zA-Z\s]+:$', line):
+            if UPPER_HEADING_PATTERN.match(line) or TITLE_HEADING_PATTERN.match(line):
                 formatted_lines.append(f'<strong>{line}</strong>')
-            elif re.match(r'^\d+\.\d+\s+.+:', line):
+            elif NUMBERED_SECTION_PATTERN.match(line):
                 # Numbered sections
                 formatted_lines.append(f'<strong>{line}</strong>')
             elif ':' in line and len(line) < 100:
@@ -126,11 +156,11 @@ def format_response(text):
     result = '\n'.join(formatted_lines)
     
     # Fix double paragraphs
-    result = re.sub(r'</p>\s*<p>', '<br>', result)
+    result = DOUBLE_PARAGRAPH_PATTERN.sub('<br>', result)
     
     # Handle steps in instructions
     if any(word in result.lower() for word in ['step', 'visit', 'click', 'enter', 'fill']):
-        result = re.sub(r'<p>(\d+)\.\s+(.+?)</p>', r'<div class="step"><strong>Step \1:</strong> \2</div>', result)
+        result = STEP_PATTERN.sub(r'<div class="step"><strong>Step \1:</strong> \2</div>', result)
     
     # Format course listings
     if 'engineering' in result.lower() or 'commerce' in result.lower():
@@ -138,10 +168,189 @@ def format_response(text):
     
     return result
 
+# Answers are rendered to HTML once when FAQs are loaded or changed
+faq_matcher = FAQMatcher(db, renderer=format_response)
+
+# Train the model on startup
+faq_matcher.fit()
+
+@app.before_request
+def start_background_jobs():
+    # Not at import: threads started there would not survive gunicorn --preload
+    # forking the workers. Returns at once after the first request
+    history_rollup.start()
+
+@app.before_request
+def start_timing():
+    g.request_start = time.perf_counter()
+    metrics.start_request_timing()
+
+@app.after_request
+def record_timing(response):
+    elapsed = time.perf_counter() - g.pop('request_start', time.perf_counter())
+    spans = metrics.end_request_timing()
+    metrics.REQUEST_SECONDS.observe(elapsed, endpoint=request.endpoint or 'unknown',
+                                    status=response.status_code)
+    if Config.SERVER_TIMING or request.headers.get('X-Debug-Timing'):
+        response.headers['Server-Timing'] = metrics.server_timing_header(spans + [('total', elapsed)])
+    return response
+
+# Response types worth compressing; images and the like already are
+COMPRESSIBLE_TYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+
+@app.after_request
+def compress(response):
+    """gzip/brotli-encode large responses for clients that accept it"""
+    if (not 200 <= response.status_code < 300 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    data = response.get_data()
+    if len(data) < Config.COMPRESS_MIN_SIZE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=Config.BROTLI_QUALITY))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=Config.GZIP_LEVEL))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def encode_cursor(values):
+    """Opaque page token for a keyset position"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token, types):
+    """Keyset position of a page token holding one value of each of types"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError('Invalid cursor')
+    for value, kind in zip(values, types):
+        # bool is an int subclass, but never a valid position
+        if not isinstance(value, kind) or isinstance(value, bool):
+            raise ValueError('Invalid cursor')
+    return values
+
+def page_limit(default):
+    limit = request.args.get('limit', default, type=int)
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return min(limit, Config.MAX_PAGE_SIZE)
+
+def paginated(rows, limit, position):
+    """JSON list of the first limit rows, with the next page's cursor in the
+    X-Next-Cursor and Link headers when rows holds one more row than limit"""
+    response = jsonify(rows[:limit])
+    if len(rows) > limit:
+        cursor = encode_cursor(position(rows[limit - 1]))
+        args = dict(request.args, cursor=cursor)
+        response.headers['X-Next-Cursor'] = cursor
+        response.headers['Link'] = f'<{url_for(request.endpoint, **args)}>; rel="next"'
+    return response
+
+def corpus_validators():
+    """Weak ETag and Last-Modified of the FAQ corpus currently served"""
+    faq_matcher.refresh()
+    state = faq_matcher.state
+    last_modified = datetime.fromtimestamp(int(state.created_at), tz=timezone.utc)
+    return state.tag, last_modified
+
+def not_modified(etag, last_modified):
+    """True when the client's cached copy is still current"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+def record_answer(payload, confidence, method):
+    """Count a /chat answer as a match or a fallback for the metrics"""
+    if payload['matched_question']:
+        metrics.MATCHES.inc(method=method, band=metrics.confidence_band(confidence))
+    else:
+        metrics.FALLBACKS.inc(method=method)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+FALLBACK_RESPONSE = (
+    "I'm sorry, I couldn't find specific information about that. Could you try rephrasing your question or ask about:"
+    "<br><br>• Course offerings<br>• Admission requirements<br>• Student portal setup<br>• Available programs"
+    "<br><br>Or contact our support team for more specific queries."
+)
+
+def build_payload(best_match, confidence):
+    """Build the /chat payload for a match, returning it with the raw confidence"""
+    if best_match and confidence > Config.ANSWER_THRESHOLD:
+        with metrics.span('format_response'):
+            response = faq_matcher.rendered_answer(best_match)
+        
+        # Add a friendly intro for better responses
+        if confidence > 0.7:
+            intro = "Here's what I found about that:<br><br>"
+            response = intro + response
+        elif confidence > 0.5:
+            intro = "Based on available information:<br><br>"
+            response = intro + response
+        
+        return {
+            'response': response,
+            'confidence': round(confidence, 2),
+            'matched_question': best_match['question'],
+            'matched_faq_id': best_match['id']
+        }, confidence
+    
+    return {
+        'response': FALLBACK_RESPONSE,
+        'confidence': round(confidence, 2) if confidence else 0.0,
+        'matched_question': None,
+        'matched_faq_id': None
+    }, confidence or 0.0
+
+def requested_categories(data):
+    """Category scope of a /chat request: None, or a list of category names"""
+    categories = data.get('categories', data.get('category'))
+    if categories is None:
+        return None
+    if isinstance(categories, str):
+        categories = [categories]
+    if not isinstance(categories, list) or not all(isinstance(c, str) for c in categories):
+        raise ValueError('category must be a string or a list of strings')
+    return categories
+
+def answer_question(user_message, categories=None):
+    """Match a message against the FAQs and build the /chat payload
+
+    Returns the JSON payload and the raw confidence score. Answers are cached
+    per normalized question (and category scope) until the FAQ corpus changes.
+    """
+    cache_key = faq_matcher.preprocess_text(user_message)
+    if categories is not None:
+        cache_key = (cache_key, tuple(sorted(categories)))
+    # Pick up generations published by other workers before trusting the cache
+    faq_matcher.refresh()
+    corpus_version = faq_matcher.corpus_version
+    with metrics.span('answer_cache'):
+        cached = answer_cache.get(cache_key, corpus_version)
+    if cached is not None:
+        return cached
+    
+    # Find best matching FAQ
+    best_match, confidence = faq_matcher.find_best_match(
+        user_message, method=Config.MATCH_METHOD, categories=categories
+    )
+    result = build_payload(best_match, confidence)
+    
+    answer_cache.put(cache_key, result, corpus_version)
+    return result
+
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
@@ -149,60 +358,210 @@ def chat():
         
         if not user_message:
             return jsonify({'error': 'Empty message'}), 400
+        try:
+            categories = requested_categories(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Find best matching FAQ
-        best_match, confidence = faq_matcher.find_best_match(user_message)
+        payload, confidence = answer_question(user_message, categories)
+        record_answer(payload, confidence, Config.MATCH_METHOD)
         
-        if best_match and confidence > 0.3:
-            response = format_response(best_match['answer'])
-            
-            # Add a friendly intro for better responses
-            if confidence > 0.7:
-                intro = "Here's what I found about that:<br><br>"
-                response = intro + response
-            elif confidence > 0.5:
-                intro = "Based on available information:<br><br>"
-                response = intro + response
-            
-            # Save to chat history
-            db.save_chat_history(user_message, response, confidence)
-            
-            return jsonify({
-                'response': response,
-                'confidence': round(confidence, 2),
-                'matched_question': best_match['question']
-            })
-        else:
-            fallback_response = "I'm sorry, I couldn't find specific information about that. Could you try rephrasing your question or ask about:"
-            fallback_response += "<br><br>• Course offerings<br>• Admission requirements<br>• Student portal setup<br>• Available programs"
-            fallback_response += "<br><br>Or contact our support team for more specific queries."
-            
-            db.save_chat_history(user_message, fallback_response, confidence or 0.0)
-            
-            return jsonify({
-                'response': fallback_response,
-                'confidence': round(confidence, 2) if confidence else 0.0,
-                'matched_question': None
-            })
+        # Save to chat history in the background
+        with metrics.span('save_chat_history'):
+            history_writer.submit(user_message, payload['response'], confidence, payload['matched_faq_id'])
+        
+        return jsonify(payload)
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer many messages in one model pass
+
+    Intended for replays and regression runs, so nothing is written to the
+    chat history.
+    """
+    try:
+        messages = request.json.get('messages', [])
+        method = request.json.get('method', Config.MATCH_METHOD)
+        
+        if not isinstance(messages, list) or not messages:
+            return jsonify({'error': 'No messages'}), 400
+        if len(messages) > Config.CHAT_BATCH_LIMIT:
+            return jsonify({'error': f'At most {Config.CHAT_BATCH_LIMIT} messages per batch'}), 400
+        if method not in MATCH_METHODS:
+            return jsonify({'error': f"method must be one of {', '.join(MATCH_METHODS)}"}), 400
+        try:
+            top_k = int(request.json.get('top_k', 1))
+        except (TypeError, ValueError):
+            top_k = 0
+        if top_k < 1:
+            return jsonify({'error': 'top_k must be an integer of at least 1'}), 400
+        top_k = min(top_k, Config.MAX_PAGE_SIZE)
+        try:
+            categories = requested_categories(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        messages = [str(message).strip() for message in messages]
+        matches = faq_matcher.find_best_matches(messages, method=method, top_k=top_k, categories=categories)
+        
+        results = []
+        for message, candidates in zip(messages, matches):
+            best_match, confidence = candidates[0]
+            payload, _ = build_payload(best_match, confidence)
+            record_answer(payload, confidence, method)
+            payload['message'] = message
+            if top_k > 1:
+                payload['candidates'] = [
+                    {'id': faq['id'], 'question': faq['question'], 'score': round(score, 4)}
+                    for faq, score in candidates if faq
+                ]
+            results.append(payload)
+        
+        return jsonify({'results': results})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/faqs', methods=['GET'])
 def get_faqs():
-    """Get all FAQs for display"""
+    """Page through FAQs in id order, optionally within one category
+
+    Pass the X-Next-Cursor value back as ?cursor= for the next page. Pages
+    carry validators of the served corpus, so unchanged pages revalidate
+    with a 304.
+    """
+    try:
+        etag, last_modified = corpus_validators()
+        if not_modified(etag, last_modified):
+            response = Response(status=304)
+        else:
+            limit = page_limit(Config.FAQS_PAGE_SIZE)
+            cursor = request.args.get('cursor')
+            after_id = decode_cursor(cursor, (int,))[0] if cursor else None
+            faqs = db.get_faqs_page(limit + 1, after_id=after_id, category=request.args.get('category'))
+            if faqs is None:
+                return jsonify({'error': 'Could not load FAQs'}), 500
+            response = paginated(faqs, limit, lambda faq: [faq['id']])
+        
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/search', methods=['GET'])
+def search_faqs():
+    """Keyword search over FAQ questions and answers, most relevant first"""
     try:
-        faqs = db.get_all_faqs()
-        return jsonify(faqs)
+        keyword = request.args.get('q', '').strip()
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', Config.SEARCH_PAGE_SIZE, type=int)
+        
+        if not keyword:
+            return jsonify({'error': 'Empty query'}), 400
+        if page < 1 or per_page < 1:
+            return jsonify({'error': 'page and per_page must be at least 1'}), 400
+        per_page = min(per_page, Config.MAX_PAGE_SIZE)
+        
+        results = db.search_faqs_by_keyword(keyword, limit=per_page, offset=(page - 1) * per_page)
+        if results is None:
+            return jsonify({'error': 'Search failed'}), 500
+        
+        return jsonify({
+            'query': keyword,
+            'page': page,
+            'per_page': per_page,
+            'total': db.count_faqs_by_keyword(keyword),
+            'results': results
+        })
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/history', methods=['GET'])
 def get_history():
-    """Get chat history"""
+    """Get chat history, newest first, a page at a time"""
+    try:
+        limit = page_limit(Config.HISTORY_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        before = decode_cursor(cursor, (str, int)) if cursor else None
+        if before:
+            try:
+                datetime.fromisoformat(before[0])
+            except ValueError:
+                raise ValueError('Invalid cursor')
+        history = db.get_chat_history_page(limit + 1, before=before)
+        if history is None:
+            return jsonify({'error': 'Could not load history'}), 500
+        return paginated(history, limit, lambda row: [str(row['created_at']), row['id']])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def rate(part, whole):
+    return round(part / whole, 4) if whole else None
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """Question volume, fallback rate, confidence and top FAQs for the last
+    ?days= days, served from the rollup tables only"""
     try:
-        history = db.get_chat_history(limit=50)
-        return jsonify(history)
+        days = request.args.get('days', Config.STATS_DAYS, type=int)
+        top = request.args.get('top', 10, type=int)
+        if days < 1 or top < 1:
+            return jsonify({'error': 'days and top must be at least 1'}), 400
+        top = min(top, Config.MAX_PAGE_SIZE)
+        
+        daily = db.get_daily_stats(days)
+        histogram = db.get_confidence_histogram(days)
+        top_faqs = db.get_top_matched_faqs(days, top)
+        unmatched = db.get_top_unmatched_questions(days, top)
+        if None in (daily, histogram, top_faqs, unmatched):
+            return jsonify({'error': 'Could not load stats'}), 500
+        
+        for row in daily:
+            row['day'] = str(row['day'])
+            row['fallbacks'] = row['questions'] - row['answered']
+            row['fallback_rate'] = rate(row['fallbacks'], row['questions'])
+            row['mean_confidence'] = rate(row.pop('confidence_sum'), row['questions'])
+        questions = sum(row['questions'] for row in daily)
+        answered = sum(row['answered'] for row in daily)
+        counts = {row['bucket']: int(row['count']) for row in histogram}
+        
+        response = jsonify({
+            'days': days,
+            'rolled_up_through': db.get_rollup_watermark(),
+            'totals': {
+                'questions': questions,
+                'answered': answered,
+                'fallbacks': questions - answered,
+                'fallback_rate': rate(questions - answered, questions)
+            },
+            'daily': daily,
+            'confidence_histogram': [
+                {'min': bucket / CONFIDENCE_BUCKETS, 'max': (bucket + 1) / CONFIDENCE_BUCKETS,
+                 'count': counts.get(bucket, 0)}
+                for bucket in range(CONFIDENCE_BUCKETS)
+            ],
+            'top_faqs': [
+                {'id': row['faq_id'], 'question': row['question'], 'count': int(row['count'])}
+                for row in top_faqs
+            ],
+            'top_unmatched': [
+                {'question': row['question'], 'count': int(row['count'])} for row in unmatched
+            ]
+        })
+        # The tables only change when the rollup job runs
+        response.cache_control.max_age = int(Config.HISTORY_ROLLUP_INTERVAL)
+        return response
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -211,26 +570,74 @@ def import_faqs():
     """Admin endpoint to import new FAQs"""
     try:
         faqs = request.json.get('faqs', [])
-        imported_count = 0
+        imported = []
         
         for faq in faqs:
-            db.insert_faq(
+            faq_id = db.insert_faq(
                 question=faq['question'],
                 answer=faq['answer'],
                 category=faq.get('category')
             )
-            imported_count += 1
+            if faq_id:
+                imported.append({
+                    'id': faq_id,
+                    'question': faq['question'],
+                    'answer': faq['answer'],
+                    'category': faq.get('category')
+                })
         
-        # Retrain the model with new FAQs
-        faq_matcher.fit()
+        # Index only the new FAQs instead of retraining on the whole corpus
+        faq_matcher.add_faqs(imported)
         
         return jsonify({
-            'message': f'Successfully imported {imported_count} FAQs',
-            'imported_count': imported_count
+            'message': f'Successfully imported {len(imported)} FAQs',
+            'imported_count': len(imported)
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/admin/faqs/<int:faq_id>', methods=['PUT'])
+def update_faq(faq_id):
+    """Admin endpoint to edit a single FAQ"""
+    try:
+        faq = db.get_faq(faq_id)
+        if not faq:
+            return jsonify({'error': 'FAQ not found'}), 404
+        
+        changes = request.json or {}
+        faq['question'] = changes.get('question', faq['question'])
+        faq['answer'] = changes.get('answer', faq['answer'])
+        faq['category'] = changes.get('category', faq['category'])
+        
+        db.update_faq(faq_id, faq['question'], faq['answer'], faq['category'])
+        faq_matcher.update_faq(faq)
+        
+        return jsonify({'message': f'Updated FAQ {faq_id}'})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/cache', methods=['GET'])
+def cache_stats():
+    """Admin endpoint reporting answer cache hit/miss counters"""
+    return jsonify(answer_cache.stats())
+
+@app.route('/admin/encoder', methods=['GET'])
+def encoder_stats():
+    """Admin endpoint reporting encode micro-batching and embedding cache counters"""
+    stats = faq_matcher.batcher.stats() if faq_matcher.batcher else {}
+    stats['enabled'] = bool(faq_matcher.batcher)
+    stats['embedding_cache'] = {
+        'hits': faq_matcher.embedding_cache_hits,
+        'misses': faq_matcher.embedding_cache_misses
+    }
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint for this worker's stage, DB and match metrics"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
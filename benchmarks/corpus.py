@@ -0,0 +1,109 @@
+import random
+
+# Vocabulary for synthetic FAQs; sizes are coprime so combinations rarely repeat
+CATEGORIES = [
+    'Admissions', 'Courses', 'Fees', 'Hostel', 'Library', 'Portal', 'Exams',
+    'Results', 'Scholarships', 'Transport', 'Clinic', 'Sports', 'ICT',
+    'Registry', 'Bursary', 'Alumni', 'Clubs', 'Cafeteria', 'Security'
+]
+TEMPLATES = [
+    'How do I {verb} my {noun} for {topic}?',
+    'Where can I {verb} the {noun} for {topic}?',
+    'What is the deadline to {verb} a {noun} in {topic}?',
+    'Who should I contact to {verb} my {noun} for {topic}?',
+    'Can I {verb} my {noun} online for {topic}?',
+    'What documents do I need to {verb} a {noun} for {topic}?',
+    'Is there a fee to {verb} my {noun} for {topic}?'
+]
+VERBS = [
+    'apply for', 'renew', 'reset', 'pay', 'collect', 'submit', 'cancel', 'change',
+    'verify', 'print', 'register', 'upgrade', 'transfer', 'replace', 'check',
+    'request', 'update', 'download', 'book', 'appeal', 'defer', 'activate', 'claim'
+]
+NOUNS = [
+    'admission form', 'password', 'school fees', 'hostel space', 'library card',
+    'transcript', 'exam timetable', 'result slip', 'scholarship', 'bus pass',
+    'medical record', 'ID card', 'course registration', 'email account',
+    'acceptance fee', 'clearance', 'certificate', 'locker', 'meal ticket',
+    'parking permit', 'project topic', 'internship letter', 'gym membership',
+    'portal profile', 'attestation letter', 'refund', 'deferment', 'carryover'
+]
+TOPICS = [
+    'ND full time', 'ND part time', 'HND', 'pre-ND', 'the first semester',
+    'the second semester', 'the new session', 'final year', 'direct entry',
+    'engineering', 'business studies', 'computer science', 'accountancy',
+    'mass communication', 'science laboratory technology', 'architecture',
+    'estate management', 'agriculture', 'hospitality', 'public administration',
+    'statistics', 'electrical engineering', 'civil engineering', 'marketing',
+    'banking and finance', 'office technology', 'fashion design', 'fine art',
+    'quantity surveying'
+]
+ANSWER_SENTENCES = [
+    'Log in to the student portal with your matriculation number.',
+    'Visit the {category} office in the administrative block between 9am and 3pm.',
+    'Bring two passport photographs and a photocopy of your acceptance letter.',
+    'Payment is made through the Remita platform and a receipt is issued immediately.',
+    'Processing takes three to five working days after submission.',
+    'Requirements: valid ID card, clearance form and evidence of payment.',
+    'Contact the {category} desk by email if you do not get a response within a week.',
+    'Late requests attract a penalty and need approval from the Head of Department.'
+]
+# Extra words mixed into queries so they are not verbatim copies of questions
+NOISE_WORDS = ['please', 'kindly', 'urgently', 'sir', 'help', 'exactly', 'now', 'again']
+OFF_TOPIC_QUERIES = [
+    'what is the weather today', 'tell me a joke', 'who won the football match',
+    'recommend a good movie', 'how far is the moon'
+]
+
+def generate_corpus(size, seed=0):
+    """Deterministic synthetic FAQs shaped like the real ones
+
+    Each question is unique; ids start at 1 like an auto-increment column.
+    """
+    rng = random.Random(seed)
+    faqs = []
+    seen = set()
+    while len(faqs) < size:
+        question = rng.choice(TEMPLATES).format(
+            verb=rng.choice(VERBS), noun=rng.choice(NOUNS), topic=rng.choice(TOPICS)
+        )
+        if question in seen:
+            # The template space is ~140k; suffix a reference once it saturates
+            question = f'{question[:-1]} (ref {len(faqs)})?'
+        seen.add(question)
+        category = rng.choice(CATEGORIES)
+        answer = ' '.join(
+            sentence.format(category=category)
+            for sentence in rng.sample(ANSWER_SENTENCES, rng.randint(1, 4))
+        )
+        faqs.append({
+            'id': len(faqs) + 1,
+            'question': question,
+            'answer': answer,
+            'category': category
+        })
+    return faqs
+
+def generate_queries(faqs, count, seed=0, off_topic_rate=0.05):
+    """User-style queries: corpus questions with words dropped, reordered or
+    added, plus a share of questions no FAQ answers"""
+    return [query for query, _ in generate_labelled_queries(faqs, count, seed, off_topic_rate)]
+
+def generate_labelled_queries(faqs, count, seed=0, off_topic_rate=0.05):
+    """generate_queries as (query, faq_id) pairs; faq_id is None for the
+    off-topic questions that should get the fallback answer"""
+    rng = random.Random(seed + 1)
+    queries = []
+    for _ in range(count):
+        if rng.random() < off_topic_rate:
+            queries.append((rng.choice(OFF_TOPIC_QUERIES), None))
+            continue
+        faq = rng.choice(faqs)
+        words = faq['question'].rstrip('?').split()
+        if len(words) > 4:
+            del words[rng.randrange(len(words))]
+        if rng.random() < 0.5:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(NOISE_WORDS))
+        query = ' '.join(words)
+        queries.append((query.lower() if rng.random() < 0.5 else query, faq['id']))
+    return queries
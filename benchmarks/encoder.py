@@ -0,0 +1,55 @@
+import hashlib
+import re
+import time
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+class HashingEncoder:
+    """Deterministic stand-in for SentenceTransformer
+
+    Hashes word unigrams and bigrams into a fixed-size vector. It has none of
+    the model's semantics but the same interface, output shape and dtype, so
+    benchmarks exercise indexing and scoring without downloading weights.
+    `cost_per_text` (seconds) simulates model inference time.
+    """
+
+    def __init__(self, dimension=384, cost_per_text=0.0):
+        self.dimension = dimension
+        self.cost_per_text = cost_per_text
+        self._buckets = {}
+
+    def _bucket(self, token):
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest, 'little') % self.dimension
+            self._buckets[token] = bucket
+        return bucket
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size)[0]
+        if self.cost_per_text:
+            # Sleeping releases the GIL, as model inference in torch does
+            time.sleep(self.cost_per_text * len(sentences))
+
+        vectors = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            tokens = TOKEN_PATTERN.findall(sentence.lower())
+            for token in tokens:
+                vectors[row, self._bucket(token)] += 1.0
+            for first, second in zip(tokens, tokens[1:]):
+                vectors[row, self._bucket(f'{first} {second}')] += 0.5
+        return vectors
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+def load_encoder(name, dimension=384, cost_per_text=0.0):
+    """'hashing' for the stub encoder, anything else is a SentenceTransformer
+    model name or local path (cached under ~/.cache after the first run)"""
+    if name == 'hashing':
+        return HashingEncoder(dimension, cost_per_text)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
@@ -0,0 +1,255 @@
+"""Accuracy/latency evaluation of matcher configurations
+
+Replays a labelled question set against every combination of a grid of
+matcher settings and reports top-1/top-k accuracy, fallback rate and
+per-query latency side by side:
+
+    python -m benchmarks.evaluate --labels labelled.csv --grid grid.json --min-accuracy 0.9
+
+Labelled sets are CSV or JSON lines files with `question` and `faq_id`
+columns; an empty faq_id means the right answer is the fallback. With
+--labels the FAQs are read from the configured MySQL database, and
+`--export-history labelled.csv` writes a starting set from chat_history,
+labelled with the FAQ each question was answered from, for review by hand.
+Without --labels a synthetic corpus with generated queries is used, and
+the embeddings come from the hashing stub unless --encoder names a model.
+
+Each combination of fit-time settings (vectorizer and embedding precision)
+is fitted once, in its own process of the pool. Latencies are measured while
+the other processes run, so compare them within one run or use --workers 1.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from threadpoolctl import threadpool_limits
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_corpus, generate_labelled_queries
+from benchmarks.encoder import load_encoder
+from benchmarks.run import environment, latency_summary
+from benchmarks.sqlite_db import SQLiteDatabase
+from config import Config
+from models.nlp_model import FAQMatcher
+
+# Settings compared by default; a --grid file replaces any of these lists.
+# precision 'float32' is the exact flat index, the others the quantized one
+DEFAULT_GRID = {
+    'method': ['tfidf', 'semantic', 'hybrid', 'cascade'],
+    'tfidf_threshold': [Config.TFIDF_THRESHOLD],
+    'semantic_threshold': [Config.SEMANTIC_THRESHOLD],
+    'answer_threshold': [Config.ANSWER_THRESHOLD],
+    'max_features': [Config.TFIDF_MAX_FEATURES, 20000],
+    'max_ngram': [1, Config.TFIDF_MAX_NGRAM],
+    'precision': ['float32', 'int8']
+}
+
+# Settings that need a fresh fit; the others are changed on a fitted matcher
+FIT_SETTINGS = ('max_features', 'max_ngram', 'precision')
+
+# FAQs, labelled questions and encoder shared by the tasks of a worker process
+_worker = {}
+
+def load_labels(path):
+    """(question, faq_id) pairs from a CSV or JSON lines file"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith(('.jsonl', '.json')):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    labelled = []
+    for row in rows:
+        faq_id = row.get('faq_id')
+        labelled.append((row['question'], int(faq_id) if faq_id not in (None, '') else None))
+    return labelled
+
+def export_history(db, path, limit):
+    """Write the latest distinct chat history questions with the FAQ each was
+    answered from, as a labelled set to review"""
+    rows = db.get_chat_history(limit) or []
+    seen = set()
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['question', 'faq_id'])
+        for row in rows:
+            if row['user_message'] not in seen:
+                seen.add(row['user_message'])
+                writer.writerow([row['user_message'], row.get('matched_faq_id') or ''])
+    return len(seen)
+
+def expand(grid):
+    """Split the grid into (fit settings, [match settings, ...]) tasks"""
+    grid = dict(DEFAULT_GRID, **grid)
+    fit_keys = [key for key in grid if key in FIT_SETTINGS]
+    match_keys = [key for key in grid if key not in FIT_SETTINGS]
+    match_settings = [dict(zip(match_keys, values)) for values in itertools.product(*(grid[k] for k in match_keys))]
+    return [
+        (dict(zip(fit_keys, values)), match_settings)
+        for values in itertools.product(*(grid[k] for k in fit_keys))
+    ]
+
+def init_worker(faqs, labelled, encoder_name, threads):
+    # Workers share the cores instead of each running a full BLAS thread pool
+    threadpool_limits(threads)
+    _worker['faqs'] = faqs
+    _worker['labelled'] = labelled
+    _worker['encoder_name'] = encoder_name
+    _worker['encoder'] = load_encoder(encoder_name)
+
+def fit_matcher(fit_settings):
+    db = SQLiteDatabase()
+    db.load_faqs(_worker['faqs'])
+    precision = fit_settings['precision']
+    matcher = FAQMatcher(
+        db, model_name=_worker['encoder_name'], snapshot_dir=None,
+        sentence_model=_worker['encoder'], batch_encodes=False,
+        index_type='flat' if precision == 'float32' else 'quantized',
+        index_options={} if precision == 'float32' else {'precision': precision},
+        vectorizer_params={
+            'max_features': fit_settings['max_features'],
+            'ngram_range': (1, fit_settings['max_ngram'])
+        }
+    )
+    matcher.fit()
+    return matcher
+
+def evaluate(matcher, settings, top_k, warmup):
+    """Replay the labelled questions one at a time, as /chat receives them"""
+    matcher.tfidf_threshold = settings['tfidf_threshold']
+    matcher.semantic_threshold = settings['semantic_threshold']
+    method = settings['method']
+    labelled = _worker['labelled']
+    for question, _ in labelled[:warmup]:
+        matcher.find_best_matches([question], method, top_k=top_k)
+
+    latencies = []
+    top1 = topk = fallbacks = 0
+    start = time.perf_counter()
+    for question, expected in labelled:
+        query_start = time.perf_counter()
+        candidates = matcher.find_best_matches([question], method, top_k=top_k)[0]
+        latencies.append(time.perf_counter() - query_start)
+
+        best, confidence = candidates[0]
+        answered = best is not None and confidence > settings['answer_threshold']
+        fallbacks += not answered
+        if expected is None:
+            top1 += not answered
+            topk += not answered
+        else:
+            top1 += answered and best['id'] == expected
+            topk += expected in {faq['id'] for faq, _ in candidates if faq}
+    summary = latency_summary(latencies, time.perf_counter() - start)
+
+    count = len(labelled)
+    return dict(summary, top1_accuracy=round(top1 / count, 4),
+                topk_accuracy=round(topk / count, 4), fallback_rate=round(fallbacks / count, 4))
+
+def run_task(fit_settings, match_settings, top_k, warmup):
+    start = time.perf_counter()
+    matcher = fit_matcher(fit_settings)
+    fit_seconds = round(time.perf_counter() - start, 4)
+    return [
+        dict(fit_settings, **settings, fit_seconds=fit_seconds, **evaluate(matcher, settings, top_k, warmup))
+        for settings in match_settings
+    ]
+
+def cheapest(results, min_accuracy):
+    """Lowest p50 latency configuration reaching min_accuracy top-1 accuracy"""
+    passing = [result for result in results if result['top1_accuracy'] >= min_accuracy]
+    if not passing:
+        return None
+    return min(passing, key=lambda result: (result['latency_ms']['p50'], -result['top1_accuracy']))
+
+def describe(result):
+    return (f"{result['method']:<8} features={result['max_features']:<6} ngram={result['max_ngram']} "
+            f"{result['precision']:<7} tfidf>{result['tfidf_threshold']} semantic>{result['semantic_threshold']} "
+            f"answer>{result['answer_threshold']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--labels', default=None, help='labelled question set, CSV or JSON lines')
+    parser.add_argument('--export-history', default=None, metavar='PATH',
+                        help='write a labelled set from chat_history to PATH and exit')
+    parser.add_argument('--export-limit', type=int, default=5000)
+    parser.add_argument('--grid', default=None, help='JSON file of setting -> list of values')
+    parser.add_argument('--size', type=int, default=5000, help='synthetic corpus size without --labels')
+    parser.add_argument('--queries', type=int, default=1000, help='synthetic questions without --labels')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--min-accuracy', type=float, default=0.9,
+                        help='top-1 accuracy bar for the recommended configuration')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--encoder', default=None,
+                        help="'hashing' stub or a SentenceTransformer model name/path; the configured "
+                             "EMBEDDING_MODEL with --labels, the stub otherwise")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help='report path, benchmarks/results/evaluate-<timestamp>.json by default')
+    args = parser.parse_args(argv)
+    # Accuracy on real questions is only meaningful with the model /chat serves
+    args.encoder = args.encoder or (Config.EMBEDDING_MODEL if args.labels else 'hashing')
+
+    if args.export_history or args.labels:
+        from database import Database
+        db = Database()
+    if args.export_history:
+        count = export_history(db, args.export_history, args.export_limit)
+        print(f"Wrote {count} questions to {args.export_history}")
+        return
+    if args.labels:
+        faqs = db.get_all_faqs()
+        labelled = load_labels(args.labels)
+    else:
+        faqs = generate_corpus(args.size, args.seed)
+        labelled = generate_labelled_queries(faqs, args.queries, args.seed)
+    if not faqs or not labelled:
+        print("Nothing to evaluate: no FAQs or no labelled questions")
+        return
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, 'r', encoding='utf-8') as f:
+            grid = json.load(f)
+    tasks = expand(grid)
+    print(f"{len(faqs)} FAQs, {len(labelled)} questions, "
+          f"{sum(len(match) for _, match in tasks)} configurations in {len(tasks)} fits")
+
+    results = []
+    workers = max(1, min(args.workers, len(tasks)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(faqs, labelled, args.encoder, threads)) as pool:
+        futures = [pool.submit(run_task, fit, match, args.top_k, args.warmup) for fit, match in tasks]
+        for future in as_completed(futures):
+            results.extend(future.result())
+
+    results.sort(key=lambda result: (-result['top1_accuracy'], result['latency_ms']['p50']))
+    for result in results:
+        print(f"  {describe(result)}  top-1 {result['top1_accuracy']:.3f} top-{args.top_k} "
+              f"{result['topk_accuracy']:.3f} fallback {result['fallback_rate']:.3f} "
+              f"p50 {result['latency_ms']['p50']:.2f}ms p95 {result['latency_ms']['p95']:.2f}ms")
+    recommended = cheapest(results, args.min_accuracy)
+    if recommended:
+        print(f"Cheapest configuration with top-1 accuracy >= {args.min_accuracy}: {describe(recommended)}")
+    else:
+        print(f"No configuration reaches top-1 accuracy {args.min_accuracy}")
+
+    report = {'environment': environment(), 'settings': vars(args), 'grid': dict(DEFAULT_GRID, **grid),
+              'results': results, 'recommended': recommended}
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results',
+        time.strftime('evaluate-%Y%m%d-%H%M%S') + '.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+if __name__ == '__main__':
+    main()
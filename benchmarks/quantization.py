@@ -0,0 +1,127 @@
+"""Memory/recall report for the quantized vector index
+
+Compares each precision/PCA combination against exact float32 search over
+the same embeddings:
+
+    python -m benchmarks.quantization --sizes 10000 100000 --pca 0 128
+
+recall@k is the fraction of the quantized top-k that scores at least the
+exact k-th best score, so ties (common with the hashing encoder) count as
+hits. The best --rerank candidates are rescored exactly.
+
+memory_bytes is what a worker that built the index holds: the codes plus a
+float16 copy of the vectors for reranking (rerank_bytes). A worker serving
+a snapshot reranks from the memory-mapped embeddings instead and holds only
+the codes (code_bytes).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_corpus, generate_queries
+from benchmarks.encoder import load_encoder
+from benchmarks.run import environment, latency_summary
+from models.nlp_model import FAQMatcher
+from models.vector_index import FlatIndex, QuantizedIndex
+
+def embed(encoder, texts, batch_size=1024):
+    vectors = [encoder.encode(texts[start:start + batch_size])
+               for start in range(0, len(texts), batch_size)]
+    return FAQMatcher._normalize(np.vstack(vectors))
+
+def recall(vectors, queries, expected_scores, found):
+    """Mean fraction of found rows whose exact score reaches the exact k-th best"""
+    hits = [
+        np.mean((vectors[rows] @ query) >= threshold - 1e-6)
+        for query, rows, threshold in zip(queries, found, expected_scores[:, -1])
+    ]
+    return float(np.mean(hits))
+
+def search_latencies(index, queries, k):
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - query_start)
+    return latency_summary(latencies, time.perf_counter() - start)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--precisions', nargs='+', choices=QuantizedIndex.PRECISIONS,
+                        default=list(QuantizedIndex.PRECISIONS))
+    parser.add_argument('--pca', type=int, nargs='+', default=[0, 128],
+                        help='PCA dimensions to try, 0 for none')
+    parser.add_argument('--rerank', type=int, nargs='+', default=[0, 32])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--encoder', default='hashing',
+                        help="'hashing' stub or a SentenceTransformer model name/path")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help='report path, benchmarks/results/quantization-<timestamp>.json by default')
+    args = parser.parse_args(argv)
+
+    encoder = load_encoder(args.encoder)
+    report = {'environment': environment(), 'settings': vars(args), 'runs': []}
+
+    for size in args.sizes:
+        print(f"Corpus of {size} FAQs")
+        faqs = generate_corpus(size, args.seed)
+        vectors = embed(encoder, [faq['question'] for faq in faqs])
+        queries = embed(encoder, generate_queries(faqs, args.queries, args.seed))
+
+        exact = FlatIndex()
+        exact.build(vectors)
+        _, expected = exact.search(queries, args.k)
+        results = [dict(search_latencies(exact, queries, args.k), index='flat',
+                        memory_bytes=int(vectors.nbytes), recall_at_1=1.0, recall_at_k=1.0)]
+
+        for precision in args.precisions:
+            for pca in args.pca:
+                for rerank in args.rerank:
+                    index = QuantizedIndex(precision, pca, rerank, args.seed)
+                    start = time.perf_counter()
+                    index.build(vectors)
+                    build_seconds = time.perf_counter() - start
+                    found, _ = index.search(queries, args.k)
+                    results.append(dict(
+                        search_latencies(index, queries, args.k), index='quantized',
+                        precision=precision, pca_dimension=pca, rerank=rerank,
+                        build_seconds=round(build_seconds, 4), memory_bytes=int(index.memory_bytes),
+                        code_bytes=int(index.memory_bytes - index.rerank_bytes),
+                        rerank_bytes=int(index.rerank_bytes),
+                        recall_at_1=round(recall(vectors, queries, expected[:, :1], found[:, :1]), 4),
+                        recall_at_k=round(recall(vectors, queries, expected, found), 4)
+                    ))
+
+        for result in results:
+            name = result['index']
+            if name == 'quantized':
+                name = f"{result['precision']} pca={result['pca_dimension']} rerank={result['rerank']}"
+            memory = f"{result['memory_bytes'] / 2 ** 20:8.2f} MiB"
+            if 'rerank_bytes' in result:
+                memory += (f" ({result['code_bytes'] / 2 ** 20:.2f} codes + "
+                           f"{result['rerank_bytes'] / 2 ** 20:.2f} rerank, codes only from a snapshot)")
+            print(f"  {name:<30} {memory} "
+                  f"recall@1 {result['recall_at_1']:.3f} recall@{args.k} {result['recall_at_k']:.3f} "
+                  f"p50 {result['latency_ms']['p50']:.2f}ms")
+        report['runs'].append({'corpus_size': size, 'results': results})
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results',
+        time.strftime('quantization-%Y%m%d-%H%M%S') + '.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""Latency/throughput benchmarks for FAQ matching and the /chat handler
+
+Runs entirely in-process against a SQLite stand-in for MySQL and, by
+default, a hashing stub instead of the sentence model:
+
+    python -m benchmarks.run --sizes 1000 10000 --concurrency 1 8 --chat
+
+Results are written as JSON (see --output) so runs can be diffed.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_corpus, generate_queries
+from benchmarks.encoder import load_encoder
+from benchmarks.sqlite_db import SQLiteDatabase
+from models.nlp_model import FAQMatcher
+
+METHODS = ['tfidf', 'semantic', 'hybrid', 'cascade']
+
+def latency_summary(latencies, wall_seconds):
+    latencies = np.asarray(latencies) * 1000.0
+    return {
+        'queries': int(len(latencies)),
+        'qps': round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        'latency_ms': {
+            'p50': round(float(np.percentile(latencies, 50)), 3),
+            'p95': round(float(np.percentile(latencies, 95)), 3),
+            'p99': round(float(np.percentile(latencies, 99)), 3),
+            'mean': round(float(latencies.mean()), 3),
+            'max': round(float(latencies.max()), 3)
+        }
+    }
+
+def measure(call, queries, concurrency):
+    """Run call(query) for every query on `concurrency` threads"""
+    def timed(query):
+        start = time.perf_counter()
+        call(query)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        latencies = [timed(query) for query in queries]
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = list(pool.map(timed, queries))
+    return latency_summary(latencies, time.perf_counter() - start)
+
+def traced_peak(call):
+    """Peak bytes allocated by call(), measured apart from any timed run
+    because tracing slows allocation-heavy code down"""
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def fit_matcher(db, args, renderer=None):
+    """Fit a matcher and report cold fit, warm re-fit and peak memory
+
+    Pass app.format_response as renderer when the matcher will serve /chat,
+    so answers are rendered once at fit time as they are in the app.
+    """
+    encoder = load_encoder(args.encoder, cost_per_text=args.encode_cost)
+    matcher = FAQMatcher(db, model_name=args.encoder, index_type=args.index,
+                         snapshot_dir=None, sentence_model=encoder, batch_encodes=False,
+                         renderer=renderer)
+
+    start = time.perf_counter()
+    matcher.fit()
+    fit_seconds = time.perf_counter() - start
+
+    # Embeddings now come from the cache, as on every re-fit after the first
+    start = time.perf_counter()
+    matcher.fit()
+    refit_seconds = time.perf_counter() - start
+
+    peak = traced_peak(matcher.fit)
+
+    state = matcher.state
+    tfidf = state.tfidf_matrix
+    return matcher, {
+        'fit_seconds': round(fit_seconds, 4),
+        'refit_seconds': round(refit_seconds, 4),
+        'fit_peak_memory_bytes': peak,
+        'tfidf_bytes': int(tfidf.data.nbytes + tfidf.indices.nbytes + tfidf.indptr.nbytes),
+        'embedding_bytes': int(state.embedding_matrix.nbytes)
+    }
+
+def bench_matcher(matcher, queries, args):
+    results = []
+    for method in args.methods:
+        # Warm up caches and lazy state outside the measured window
+        for query in queries[:args.warmup]:
+            matcher.find_best_match(query, method)
+
+        for concurrency in args.concurrency:
+            result = measure(lambda query: matcher.find_best_match(query, method), queries, concurrency)
+            results.append(dict(result, target='find_best_match', method=method, concurrency=concurrency))
+
+        start = time.perf_counter()
+        matcher.find_best_matches(queries, method)
+        wall = time.perf_counter() - start
+        results.append({
+            'target': 'find_best_matches', 'method': method, 'concurrency': 1,
+            'queries': len(queries), 'qps': round(len(queries) / wall, 2),
+            'peak_memory_bytes': traced_peak(lambda: matcher.find_best_matches(queries, method)),
+            'query_peak_memory_bytes': traced_peak(
+                lambda: [matcher.find_best_match(query, method) for query in queries[:max(args.warmup, 1)]])
+        })
+    return results
+
+def load_chat_app():
+    """Import app.py with its module-level Database replaced by SQLite"""
+    import database
+    original = database.Database
+    database.Database = SQLiteDatabase
+    try:
+        import app
+    finally:
+        database.Database = original
+    return app
+
+def bench_chat(chat_app, db, matcher, queries, args):
+    """Drive the full /chat route through Flask's test client"""
+    from history_writer import ChatHistoryWriter
+
+    chat_app.history_writer.close()
+    chat_app.history_rollup.close()
+    chat_app.db = db
+    chat_app.history_writer = ChatHistoryWriter(db)
+    chat_app.faq_matcher = matcher
+    clients = threading.local()
+
+    def post(query):
+        if not hasattr(clients, 'client'):
+            clients.client = chat_app.app.test_client()
+        response = clients.client.post('/chat', json={'message': query})
+        if response.status_code != 200:
+            raise RuntimeError(f'/chat returned {response.status_code}')
+
+    results = []
+    for concurrency in args.concurrency:
+        # Every run starts cold so runs are comparable
+        chat_app.answer_cache.clear()
+        result = measure(post, queries, concurrency)
+        results.append(dict(result, target='chat', method=chat_app.Config.MATCH_METHOD,
+                            concurrency=concurrency, answer_cache=chat_app.answer_cache.stats()))
+    chat_app.history_writer.close()
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--methods', nargs='+', choices=METHODS, default=['tfidf', 'semantic', 'hybrid'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--encoder', default='hashing',
+                        help="'hashing' stub or a SentenceTransformer model name/path")
+    parser.add_argument('--encode-cost', type=float, default=0.0,
+                        help='simulated seconds per text for the hashing encoder')
+    parser.add_argument('--index', default='flat', help='vector index type')
+    parser.add_argument('--chat', action='store_true', help='also benchmark the /chat route')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help='report path, benchmarks/results/<timestamp>.json by default')
+    args = parser.parse_args(argv)
+
+    report = {'environment': environment(), 'settings': vars(args), 'runs': []}
+    chat_app = load_chat_app() if args.chat else None
+
+    for size in args.sizes:
+        print(f"Corpus of {size} FAQs")
+        faqs = generate_corpus(size, args.seed)
+        queries = generate_queries(faqs, args.queries, args.seed)
+        db = SQLiteDatabase()
+        db.load_faqs(faqs)
+
+        matcher, fit = fit_matcher(db, args, chat_app.format_response if chat_app else None)
+        print(f"  fit {fit['fit_seconds']}s, re-fit {fit['refit_seconds']}s, "
+              f"peak {fit['fit_peak_memory_bytes'] / 2 ** 20:.1f} MiB")
+        results = bench_matcher(matcher, queries, args)
+        if chat_app:
+            results += bench_chat(chat_app, db, matcher, queries, args)
+
+        for result in results:
+            if 'latency_ms' in result:
+                latency = result['latency_ms']
+                print(f"  {result['target']:<18} {result['method']:<9} x{result['concurrency']:<3} "
+                      f"p50 {latency['p50']:.2f}ms p95 {latency['p95']:.2f}ms p99 {latency['p99']:.2f}ms "
+                      f"{result['qps']} qps")
+            else:
+                print(f"  {result['target']:<18} {result['method']:<9} batch {result['qps']} qps, "
+                      f"peak {result['peak_memory_bytes'] / 2 ** 20:.1f} MiB "
+                      f"({result['query_peak_memory_bytes'] / 2 ** 20:.2f} MiB single query)")
+        report['runs'].append({'corpus_size': size, 'fit': fit, 'results': results})
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results',
+        time.strftime('%Y%m%d-%H%M%S') + '.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import re
+import sqlite3
+import threading
+from database import Database
+
+# SQLite versions of the tables the application expects in MySQL
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS faqs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    category TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS chat_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_message TEXT NOT NULL,
+    bot_response TEXT NOT NULL,
+    confidence_score REAL,
+    matched_faq_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    model_name TEXT NOT NULL,
+    question_hash TEXT NOT NULL,
+    dimension INTEGER NOT NULL,
+    embedding BLOB NOT NULL,
+    PRIMARY KEY (model_name, question_hash)
+);
+"""
+
+UPSERT_PATTERN = re.compile(r'\s*ON DUPLICATE KEY UPDATE.*$', re.IGNORECASE | re.DOTALL)
+
+def translate(query):
+    """Rewrite the MySQL dialect used by the application for SQLite"""
+    if UPSERT_PATTERN.search(query):
+        # Every upsert in the application replaces the whole row
+        query = UPSERT_PATTERN.sub('', query).replace('INSERT INTO', 'INSERT OR REPLACE INTO', 1)
+    return query.replace('%s', '?')
+
+class SQLiteDatabase(Database):
+    """Database backed by SQLite so benchmarks run without a MySQL server
+
+    Only the connection layer is replaced; the query methods are inherited,
+    so benchmarks issue the same statements as production.
+    """
+
+    def __init__(self, path=':memory:'):
+        self.config = None
+        self.pool = None
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self.setup_schema()
+
+    def execute_query(self, query, params=None, fetch=False):
+        try:
+            with self._lock:
+                cursor = self._connection.execute(translate(query), params or ())
+                if fetch:
+                    return [dict(row) for row in cursor.fetchall()]
+                self._connection.commit()
+                return cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+
+    def execute_many(self, query, rows, batch_size=500):
+        if not rows:
+            return 0
+        try:
+            with self._lock, self._connection:
+                cursor = self._connection.executemany(translate(query), rows)
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+
+    def column_exists(self, table, column):
+        rows = self.execute_query(f"PRAGMA table_info({table})", fetch=True) or []
+        return any(row['name'] == column for row in rows)
+
+    def setup_schema(self):
+        with self._lock:
+            self._connection.executescript(SCHEMA)
+
+    def load_faqs(self, faqs):
+        """Bulk load generated FAQs, keeping their ids"""
+        self.execute_many(
+            "INSERT INTO faqs (id, question, answer, category) VALUES (%s, %s, %s, %s)",
+            [(faq['id'], faq['question'], faq['answer'], faq['category']) for faq in faqs]
+        )
@@ -8,4 +8,152 @@ class Config:
     MYSQL_USER = os.getenv('MYSQL_USER', 'root')
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', '')
     MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'faq_chatbot')
-    MYSQL_PORT = os.getenv('MYSQL_PORT', 3306)
\ No newline at end of file
+    MYSQL_PORT = int(os.getenv('MYSQL_PORT', 3306))
+
+    # Connection pool: requests check a connection out per query and wait up to
+    # MYSQL_POOL_TIMEOUT seconds when all MYSQL_POOL_SIZE connections are busy
+    MYSQL_POOL_NAME = os.getenv('MYSQL_POOL_NAME', 'faq_chatbot_pool')
+    MYSQL_POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', 5))
+    MYSQL_POOL_TIMEOUT = float(os.getenv('MYSQL_POOL_TIMEOUT', 10))
+    MYSQL_CONNECT_RETRIES = int(os.getenv('MYSQL_CONNECT_RETRIES', 3))
+    MYSQL_RETRY_BACKOFF = float(os.getenv('MYSQL_RETRY_BACKOFF', 0.5))
+
+    # Incremental FAQ indexing: force a full TF-IDF re-fit after this many seconds
+    # or once this share of newly indexed tokens is missing from the vocabulary
+    TFIDF_REFIT_INTERVAL = int(os.getenv('TFIDF_REFIT_INTERVAL', 24 * 60 * 60))
+    TFIDF_DRIFT_THRESHOLD = float(os.getenv('TFIDF_DRIFT_THRESHOLD', 0.2))
+
+    # Chat history is written behind the request path in batches. When the queue
+    # is full HISTORY_OVERFLOW decides what happens: 'block' waits up to
+    # HISTORY_BLOCK_TIMEOUT seconds, 'drop' discards, 'spill' appends to a file
+    # (HISTORY_SPILL_PATH suffixed with the worker's pid) that is replayed once
+    # the database accepts writes again
+    HISTORY_QUEUE_SIZE = int(os.getenv('HISTORY_QUEUE_SIZE', 10000))
+    HISTORY_BATCH_SIZE = int(os.getenv('HISTORY_BATCH_SIZE', 200))
+    HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', 1.0))
+    HISTORY_OVERFLOW = os.getenv('HISTORY_OVERFLOW', 'block')
+    HISTORY_BLOCK_TIMEOUT = float(os.getenv('HISTORY_BLOCK_TIMEOUT', 0.5))
+    HISTORY_SPILL_PATH = os.getenv('HISTORY_SPILL_PATH', 'chat_history_spill.jsonl')
+
+    # Every HISTORY_ROLLUP_INTERVAL seconds new chat history is folded into the
+    # daily stats tables behind /stats, HISTORY_ROLLUP_BATCH_SIZE rows at a time
+    # (0 disables the background job; run history_rollup.py from cron instead).
+    # Rolled-up rows older than HISTORY_RETENTION_DAYS (0 keeps everything) are
+    # moved to chat_history_archive, or deleted when HISTORY_ARCHIVE is off.
+    # Rows are only rolled up HISTORY_ROLLUP_SETTLE_SECONDS after they were
+    # written, once concurrent inserts with lower ids have committed
+    HISTORY_ROLLUP_INTERVAL = float(os.getenv('HISTORY_ROLLUP_INTERVAL', 300))
+    HISTORY_ROLLUP_BATCH_SIZE = int(os.getenv('HISTORY_ROLLUP_BATCH_SIZE', 5000))
+    HISTORY_ROLLUP_SETTLE_SECONDS = int(os.getenv('HISTORY_ROLLUP_SETTLE_SECONDS', 60))
+    HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', 90))
+    HISTORY_ARCHIVE = os.getenv('HISTORY_ARCHIVE', 'true').lower() in ('1', 'true', 'yes')
+
+    # Days covered by /stats unless the request asks for ?days=
+    STATS_DAYS = int(os.getenv('STATS_DAYS', 30))
+
+    # Answer cache for repeated questions, bounded by entry count and bytes
+    ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', 5000))
+    ANSWER_CACHE_MAX_BYTES = int(os.getenv('ANSWER_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', 60 * 60))
+
+    # Maximum number of messages accepted by /chat/batch
+    CHAT_BATCH_LIMIT = int(os.getenv('CHAT_BATCH_LIMIT', 5000))
+
+    # Vector index behind semantic matching: 'flat' (exact), 'ivf', 'hnsw' or
+    # 'quantized'. IVF_NLIST of 0 picks sqrt(corpus size) lists; raise
+    # IVF_NPROBE or HNSW_EF_SEARCH for better recall at the cost of latency
+    VECTOR_INDEX = os.getenv('VECTOR_INDEX', 'flat')
+    IVF_NLIST = int(os.getenv('IVF_NLIST', 0))
+    IVF_NPROBE = int(os.getenv('IVF_NPROBE', 8))
+    HNSW_M = int(os.getenv('HNSW_M', 16))
+    HNSW_EF_CONSTRUCTION = int(os.getenv('HNSW_EF_CONSTRUCTION', 200))
+    HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', 64))
+
+    # 'quantized' index: EMBEDDING_PRECISION is 'int8' or 'float16', an
+    # EMBEDDING_PCA_DIM above 0 projects vectors to that many dimensions first,
+    # and the best QUANTIZED_RERANK candidates are rescored exactly. int8 is
+    # both smaller and faster to score than float16.
+    # Per-worker memory for N FAQs of dimension D (P after PCA): int8 codes
+    # take N * (P + 4) bytes, float16 codes N * P * 2. Reranking reads the
+    # snapshot's float32 embeddings through a shared memory map (N * D * 4
+    # bytes of page cache per host); a worker that fitted the corpus itself
+    # keeps its own float16 copy instead (N * D * 2 bytes, shared with the
+    # codes for float16 without PCA), and publishes those float16-rounded
+    # embeddings in its snapshot
+    EMBEDDING_PRECISION = os.getenv('EMBEDDING_PRECISION', 'int8')
+    EMBEDDING_PCA_DIM = int(os.getenv('EMBEDDING_PCA_DIM', 0))
+    QUANTIZED_RERANK = int(os.getenv('QUANTIZED_RERANK', 32))
+
+    # Matching method used by /chat: 'tfidf', 'semantic', 'hybrid' or 'cascade'
+    MATCH_METHOD = os.getenv('MATCH_METHOD', 'hybrid')
+
+    # Minimum TF-IDF or semantic similarity for a match, the TF-IDF vocabulary
+    # size and longest n-gram, and the confidence /chat needs to answer from an
+    # FAQ rather than with the fallback. benchmarks/evaluate.py compares settings
+    TFIDF_THRESHOLD = float(os.getenv('TFIDF_THRESHOLD', 0.3))
+    SEMANTIC_THRESHOLD = float(os.getenv('SEMANTIC_THRESHOLD', 0.5))
+    TFIDF_MAX_FEATURES = int(os.getenv('TFIDF_MAX_FEATURES', 5000))
+    TFIDF_MAX_NGRAM = int(os.getenv('TFIDF_MAX_NGRAM', 2))
+    ANSWER_THRESHOLD = float(os.getenv('ANSWER_THRESHOLD', 0.3))
+
+    # Cascade retrieval (method='cascade'): TF-IDF shortlists CASCADE_SHORTLIST
+    # FAQs, which are reranked with embeddings unless the TF-IDF score already
+    # reaches CASCADE_EARLY_EXIT. CASCADE_FUSION is 'weighted' or 'rrf'
+    CASCADE_SHORTLIST = int(os.getenv('CASCADE_SHORTLIST', 50))
+    CASCADE_EARLY_EXIT = float(os.getenv('CASCADE_EARLY_EXIT', 0.8))
+    CASCADE_FUSION = os.getenv('CASCADE_FUSION', 'weighted')
+    CASCADE_SEMANTIC_WEIGHT = float(os.getenv('CASCADE_SEMANTIC_WEIGHT', 0.6))
+    CASCADE_THRESHOLD = float(os.getenv('CASCADE_THRESHOLD', 0.4))
+    CASCADE_RRF_K = int(os.getenv('CASCADE_RRF_K', 60))
+
+    # Sentence embedding model name or local path
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+
+    # Directory holding published matcher snapshot generations, shared by all
+    # workers on a host; empty disables snapshots. Workers look for a newer
+    # generation at most every SNAPSHOT_CHECK_INTERVAL seconds
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots/faq_matcher')
+    SNAPSHOT_CHECK_INTERVAL = float(os.getenv('SNAPSHOT_CHECK_INTERVAL', 2.0))
+    SNAPSHOT_KEEP = int(os.getenv('SNAPSHOT_KEEP', 3))
+
+    # Micro-batching of query encodes: concurrent /chat requests arriving within
+    # ENCODE_MAX_WAIT_MS of each other share one model pass of up to
+    # ENCODE_MAX_BATCH_SIZE questions. A request whose questions are not
+    # encoded within ENCODE_TIMEOUT_MS encodes them itself
+    ENCODE_BATCHING = os.getenv('ENCODE_BATCHING', 'false').lower() in ('1', 'true', 'yes')
+    ENCODE_MAX_BATCH_SIZE = int(os.getenv('ENCODE_MAX_BATCH_SIZE', 32))
+    ENCODE_MAX_WAIT_MS = float(os.getenv('ENCODE_MAX_WAIT_MS', 5))
+    ENCODE_TIMEOUT_MS = float(os.getenv('ENCODE_TIMEOUT_MS', 2000))
+
+    # Bulk FAQ imports insert and commit this many rows per transaction
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+
+    # Add a Server-Timing header with per-stage durations to every response.
+    # Clients can also ask for it per request with an X-Debug-Timing header
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+
+    # Default page sizes for /search, /faqs and /history; clients can ask for
+    # up to MAX_PAGE_SIZE rows per page
+    SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 20))
+    FAQS_PAGE_SIZE = int(os.getenv('FAQS_PAGE_SIZE', 100))
+    HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', 50))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 500))
+
+    # Responses larger than COMPRESS_MIN_SIZE bytes are brotli (when the
+    # brotli package is installed) or gzip compressed for clients accepting it
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+    BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+
+    # Per-category sub-indexes, built with every fit when CATEGORY_PARTITIONS
+    # is on (otherwise on first use). With CATEGORY_ROUTING, questions sent
+    # without a category are scored only against the CATEGORY_ROUTER_TOP
+    # categories whose TF-IDF centroid is at least CATEGORY_ROUTER_MIN_SCORE
+    # similar, and against every FAQ when none is. Partitions of at least
+    # CATEGORY_INDEX_MIN_ROWS FAQs get their own VECTOR_INDEX index; smaller
+    # ones are searched exactly
+    CATEGORY_PARTITIONS = os.getenv('CATEGORY_PARTITIONS', 'true').lower() in ('1', 'true', 'yes')
+    CATEGORY_ROUTING = os.getenv('CATEGORY_ROUTING', 'false').lower() in ('1', 'true', 'yes')
+    CATEGORY_ROUTER_TOP = int(os.getenv('CATEGORY_ROUTER_TOP', 2))
+    CATEGORY_ROUTER_MIN_SCORE = float(os.getenv('CATEGORY_ROUTER_MIN_SCORE', 0.15))
+    CATEGORY_INDEX_MIN_ROWS = int(os.getenv('CATEGORY_INDEX_MIN_ROWS', 10000))
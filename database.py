@@ -1,67 +1,538 @@
 import mysql.connector
+from mysql.connector import errors, pooling
 from config import Config
-import json
+from metrics import DB_ERRORS, DB_QUERY_SECONDS, statement_type, timed
+from contextlib import contextmanager
+import re
+import threading
+import time
+
+# Embeddings keyed by the text they were computed from, shared by every FAQ
+# (and every re-fit) with the same question under the same model
+EMBEDDING_CACHE_TABLE = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    model_name VARCHAR(128) NOT NULL,
+    question_hash CHAR(64) NOT NULL,
+    dimension SMALLINT UNSIGNED NOT NULL,
+    embedding MEDIUMBLOB NOT NULL,
+    PRIMARY KEY (model_name, question_hash)
+)
+"""
+
+# Keyword search indexes: question matches are weighted above answer matches,
+# which needs one index on the question alone and one on both columns
+FULLTEXT_INDEXES = {
+    'ft_faqs_question': "ALTER TABLE faqs ADD FULLTEXT INDEX ft_faqs_question (question)",
+    'ft_faqs_text': "ALTER TABLE faqs ADD FULLTEXT INDEX ft_faqs_text (question, answer)"
+}
+
+# Indexes backing the keyset-paginated listings, as (table, name, statement)
+LISTING_INDEXES = [
+    ('faqs', 'idx_faqs_category_id', "ALTER TABLE faqs ADD INDEX idx_faqs_category_id (category, id)"),
+    ('chat_history', 'idx_chat_history_created_id',
+     "ALTER TABLE chat_history ADD INDEX idx_chat_history_created_id (created_at, id)")
+]
+
+# FAQ a chat answer came from, NULL for fallback answers
+CHAT_HISTORY_MIGRATION = "ALTER TABLE chat_history ADD COLUMN matched_faq_id INT NULL"
+# chat_rollup_state row holding the last chat_history id written before the
+# migration, whose matched_faq_id is NULL whether or not a FAQ answered it
+LEGACY_HISTORY_WATERMARK = 'chat_history_legacy'
+
+# Rolled-up history older than the retention period is moved here, keeping
+# chat_history (and every query on it) small
+CHAT_HISTORY_ARCHIVE_TABLE = "CREATE TABLE IF NOT EXISTS chat_history_archive LIKE chat_history"
+CHAT_HISTORY_COLUMNS = "id, user_message, bot_response, confidence_score, matched_faq_id, created_at"
+
+# Per-day aggregates of chat history maintained by history_rollup, so /stats
+# never reads raw rows. chat_rollup_state holds the last chat_history id
+# folded into them
+ROLLUP_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS chat_stats_daily (
+        day DATE NOT NULL PRIMARY KEY,
+        questions INT UNSIGNED NOT NULL,
+        answered INT UNSIGNED NOT NULL,
+        confidence_sum DOUBLE NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_stats_confidence (
+        day DATE NOT NULL,
+        bucket TINYINT UNSIGNED NOT NULL,
+        count INT UNSIGNED NOT NULL,
+        PRIMARY KEY (day, bucket)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_stats_faqs (
+        day DATE NOT NULL,
+        faq_id INT NOT NULL,
+        count INT UNSIGNED NOT NULL,
+        PRIMARY KEY (day, faq_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_stats_unmatched (
+        day DATE NOT NULL,
+        question_hash CHAR(64) NOT NULL,
+        question VARCHAR(255) NOT NULL,
+        count INT UNSIGNED NOT NULL,
+        PRIMARY KEY (day, question_hash)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_rollup_state (
+        name VARCHAR(64) NOT NULL PRIMARY KEY,
+        last_id BIGINT UNSIGNED NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """
+]
+
+# Words of a keyword search; boolean full-text operators are dropped
+KEYWORD_PATTERN = re.compile(r'\w+')
 
 class Database:
     def __init__(self):
         self.config = Config()
-        self.connection = None
-        self.connect()
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        if self.connect():
+            self.setup_schema()
 
     def connect(self):
+        """Create the connection pool, retrying with exponential backoff"""
+        delay = self.config.MYSQL_RETRY_BACKOFF
+        for attempt in range(1, self.config.MYSQL_CONNECT_RETRIES + 1):
+            try:
+                self.pool = pooling.MySQLConnectionPool(
+                    pool_name=self.config.MYSQL_POOL_NAME,
+                    pool_size=self.config.MYSQL_POOL_SIZE,
+                    pool_reset_session=True,
+                    host=self.config.MYSQL_HOST,
+                    user=self.config.MYSQL_USER,
+                    password=self.config.MYSQL_PASSWORD,
+                    database=self.config.MYSQL_DATABASE,
+                    port=self.config.MYSQL_PORT
+                )
+                print("Connected to MySQL database")
+                return True
+            except mysql.connector.Error as e:
+                print(f"Error connecting to MySQL (attempt {attempt}): {e}")
+                if attempt < self.config.MYSQL_CONNECT_RETRIES:
+                    time.sleep(delay)
+                    delay *= 2
+        return False
+
+    @contextmanager
+    def get_connection(self):
+        """Check a healthy pooled connection out for one unit of work"""
+        if self.pool is None:
+            with self._pool_lock:
+                if self.pool is None:
+                    if not self.connect():
+                        raise errors.InterfaceError("No MySQL connection available")
+                    # MySQL was down when this process started, so the schema
+                    # was never set up; only the pool exists at this point
+                    self.setup_schema()
+
+        connection = self._checkout()
         try:
-            self.connection = mysql.connector.connect(
-                host=self.config.MYSQL_HOST,
-                user=self.config.MYSQL_USER,
-                password=self.config.MYSQL_PASSWORD,
-                database=self.config.MYSQL_DATABASE,
-                port=self.config.MYSQL_PORT
-            )
-            print("Connected to MySQL database")
-        except mysql.connector.Error as e:
-            print(f"Error connecting to MySQL: {e}")
+            yield connection
+        finally:
+            # Closing a pooled connection hands it back to the pool
+            connection.close()
+
+    def _checkout(self):
+        """Wait for a free connection, reconnecting dropped ones with backoff"""
+        deadline = time.monotonic() + self.config.MYSQL_POOL_TIMEOUT
+        delay = self.config.MYSQL_RETRY_BACKOFF
+        attempts = 0
+        while True:
+            try:
+                # The pool pings the connection and reconnects it if it went away
+                return self.pool.get_connection()
+            except errors.PoolError:
+                # Every connection is checked out; wait briefly for one to come back
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.01)
+            except (errors.InterfaceError, errors.OperationalError):
+                attempts += 1
+                if attempts >= self.config.MYSQL_CONNECT_RETRIES or time.monotonic() >= deadline:
+                    raise
+                time.sleep(delay)
+                delay *= 2
 
     def execute_query(self, query, params=None, fetch=False):
+        operation = statement_type(query)
+        try:
+            with timed(DB_QUERY_SECONDS, 'db', operation=operation), self.get_connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute(query, params or ())
+                
+                if fetch:
+                    result = cursor.fetchall()
+                else:
+                    connection.commit()
+                    result = cursor.lastrowid
+                
+                cursor.close()
+                return result
+        except mysql.connector.Error as e:
+            DB_ERRORS.inc(operation=operation)
+            print(f"Database error: {e}")
+            return None
+
+    def run_transaction(self, work, operation='transaction'):
+        """Call work(cursor) in one transaction and return its result,
+        rolling everything back if any statement fails"""
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            
-            if fetch:
-                result = cursor.fetchall()
-            else:
-                self.connection.commit()
-                result = cursor.lastrowid
-            
-            cursor.close()
-            return result
+            with timed(DB_QUERY_SECONDS, 'db', operation=operation), self.get_connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                try:
+                    result = work(cursor)
+                    connection.commit()
+                    return result
+                except mysql.connector.Error:
+                    connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
         except mysql.connector.Error as e:
+            DB_ERRORS.inc(operation=operation)
             print(f"Database error: {e}")
             return None
 
+    def execute_many(self, query, rows, batch_size=500):
+        """Run one statement for many parameter rows inside a single transaction"""
+        if not rows:
+            return 0
+        operation = statement_type(query)
+        try:
+            with timed(DB_QUERY_SECONDS, 'db', operation=operation), self.get_connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    count = 0
+                    for start in range(0, len(rows), batch_size):
+                        cursor.executemany(query, rows[start:start + batch_size])
+                        count += cursor.rowcount
+                    connection.commit()
+                    return count
+                except mysql.connector.Error:
+                    connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+        except mysql.connector.Error as e:
+            DB_ERRORS.inc(operation=operation)
+            print(f"Database error: {e}")
+            return None
+
+    def column_exists(self, table, column):
+        query = """
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """
+        return bool(self.execute_query(query, (table, column), fetch=True))
+
+    def index_exists(self, table, index):
+        query = """
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """
+        return bool(self.execute_query(query, (table, index), fetch=True))
+
+    def setup_schema(self):
+        """Create or upgrade the tables managed by the application"""
+        self.execute_query(EMBEDDING_CACHE_TABLE)
+        for index, statement in FULLTEXT_INDEXES.items():
+            if not self.index_exists('faqs', index):
+                self.execute_query(statement)
+        for table, index, statement in LISTING_INDEXES:
+            if not self.index_exists(table, index):
+                self.execute_query(statement)
+        legacy = None
+        if not self.column_exists('chat_history', 'matched_faq_id'):
+            legacy = self.execute_query("SELECT COALESCE(MAX(id), 0) AS last_id FROM chat_history", fetch=True)
+            self.execute_query(CHAT_HISTORY_MIGRATION)
+        self.execute_query(CHAT_HISTORY_ARCHIVE_TABLE)
+        for statement in ROLLUP_TABLES:
+            self.execute_query(statement)
+        self.execute_query("INSERT IGNORE INTO chat_rollup_state (name, last_id) VALUES ('chat_history', 0)")
+        if legacy:
+            self.execute_query(
+                "INSERT IGNORE INTO chat_rollup_state (name, last_id) VALUES (%s, %s)",
+                (LEGACY_HISTORY_WATERMARK, legacy[0]['last_id'])
+            )
+
     def insert_faq(self, question, answer, category=None):
         query = "INSERT INTO faqs (question, answer, category) VALUES (%s, %s, %s)"
         return self.execute_query(query, (question, answer, category))
 
+    def insert_faqs(self, rows, batch_size=500):
+        """Insert (question, answer, category) rows in one transaction"""
+        query = "INSERT INTO faqs (question, answer, category) VALUES (%s, %s, %s)"
+        return self.execute_many(query, rows, batch_size)
+
+    def get_faq_questions(self):
+        """Every FAQ question without the answers, for duplicate checks"""
+        query = "SELECT id, question FROM faqs"
+        return self.execute_query(query, fetch=True)
+
+    def update_faq(self, faq_id, question, answer, category=None):
+        query = "UPDATE faqs SET question = %s, answer = %s, category = %s WHERE id = %s"
+        return self.execute_query(query, (question, answer, category, faq_id))
+
+    def get_faq(self, faq_id):
+        query = "SELECT * FROM faqs WHERE id = %s"
+        results = self.execute_query(query, (faq_id,), fetch=True)
+        return results[0] if results else None
+
     def get_all_faqs(self):
         query = "SELECT * FROM faqs ORDER BY category, id"
         return self.execute_query(query, fetch=True)
 
-    def search_faqs_by_keyword(self, keyword):
+    def get_faqs_page(self, limit, after_id=None, category=None):
+        """Up to limit FAQs in id order, starting after after_id"""
+        conditions, params = [], []
+        if category is not None:
+            conditions.append("category = %s")
+            params.append(category)
+        if after_id is not None:
+            conditions.append("id > %s")
+            params.append(after_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT * FROM faqs {where} ORDER BY id LIMIT %s"
+        return self.execute_query(query, (*params, limit), fetch=True)
+
+    def search_faqs_by_keyword(self, keyword, limit=20, offset=0):
+        """FAQs matching any word of keyword, most relevant first
+
+        Uses the FULLTEXT indexes with prefix matching, so partially typed
+        words match. Falls back to a LIKE scan if the indexes are missing.
+        """
+        terms = self.fulltext_terms(keyword)
+        if not terms:
+            return []
+        query = """
+        SELECT *,
+            MATCH(question) AGAINST (%s IN BOOLEAN MODE) * 2
+            + MATCH(question, answer) AGAINST (%s IN BOOLEAN MODE) AS score
+        FROM faqs
+        WHERE MATCH(question, answer) AGAINST (%s IN BOOLEAN MODE)
+        ORDER BY score DESC, id
+        LIMIT %s OFFSET %s
+        """
+        results = self.execute_query(query, (terms, terms, terms, limit, offset), fetch=True)
+        if results is None:
+            return self._search_faqs_by_like(keyword, limit, offset)
+        return results
+
+    def count_faqs_by_keyword(self, keyword):
+        terms = self.fulltext_terms(keyword)
+        if not terms:
+            return 0
+        query = "SELECT COUNT(*) AS total FROM faqs WHERE MATCH(question, answer) AGAINST (%s IN BOOLEAN MODE)"
+        results = self.execute_query(query, (terms,), fetch=True)
+        if results is None:
+            query = "SELECT COUNT(*) AS total FROM faqs WHERE question LIKE %s OR answer LIKE %s"
+            results = self.execute_query(query, (f'%{keyword}%', f'%{keyword}%'), fetch=True)
+        return results[0]['total'] if results else 0
+
+    @staticmethod
+    def fulltext_terms(keyword):
+        """Boolean-mode query matching any word of keyword as a prefix"""
+        return ' '.join(f'{word}*' for word in KEYWORD_PATTERN.findall(keyword or ''))
+
+    def _search_faqs_by_like(self, keyword, limit, offset):
         query = """
         SELECT * FROM faqs 
         WHERE question LIKE %s OR answer LIKE %s
         ORDER BY category
+        LIMIT %s OFFSET %s
         """
-        params = (f'%{keyword}%', f'%{keyword}%')
+        params = (f'%{keyword}%', f'%{keyword}%', limit, offset)
         return self.execute_query(query, params, fetch=True)
 
-    def save_chat_history(self, user_message, bot_response, confidence_score=None):
+    def save_chat_history(self, user_message, bot_response, confidence_score=None, matched_faq_id=None):
+        query = """
+        INSERT INTO chat_history (user_message, bot_response, confidence_score, matched_faq_id)
+        VALUES (%s, %s, %s, %s)
+        """
+        return self.execute_query(query, (user_message, bot_response, confidence_score, matched_faq_id))
+
+    def save_chat_history_batch(self, rows):
+        """Insert (user_message, bot_response, confidence_score, matched_faq_id)
+        rows in one transaction"""
         query = """
-        INSERT INTO chat_history (user_message, bot_response, confidence_score)
-        VALUES (%s, %s, %s)
+        INSERT INTO chat_history (user_message, bot_response, confidence_score, matched_faq_id)
+        VALUES (%s, %s, %s, %s)
         """
-        return self.execute_query(query, (user_message, bot_response, confidence_score))
+        return self.execute_many(query, rows)
 
     def get_chat_history(self, limit=50):
-        query = "SELECT * FROM chat_history ORDER BY created_at DESC LIMIT %s"
-        return self.execute_query(query, (limit,), fetch=True)
\ No newline at end of file
+        query = "SELECT * FROM chat_history ORDER BY created_at DESC, id DESC LIMIT %s"
+        return self.execute_query(query, (limit,), fetch=True)
+
+    def get_chat_history_page(self, limit, before=None):
+        """Up to limit history rows, newest first, older than the
+        (created_at, id) position before"""
+        if before is None:
+            query = "SELECT * FROM chat_history ORDER BY created_at DESC, id DESC LIMIT %s"
+            return self.execute_query(query, (limit,), fetch=True)
+        created_at, row_id = before
+        query = """
+        SELECT * FROM chat_history
+        WHERE created_at < %s OR (created_at = %s AND id < %s)
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+        """
+        return self.execute_query(query, (created_at, created_at, row_id, limit), fetch=True)
+
+    def get_chat_history_after(self, after_id, limit, settle_seconds=0):
+        """Up to limit history rows with ids above after_id, oldest first,
+        without the bot responses
+
+        Stops before the first row written less than settle_seconds ago: ids
+        are taken at insert time, so rows below it may not be committed yet.
+        """
+        query = """
+        SELECT id, user_message, confidence_score, matched_faq_id, created_at,
+            created_at < NOW() - INTERVAL %s SECOND AS settled
+        FROM chat_history
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+        """
+        rows = self.execute_query(query, (settle_seconds, after_id, limit), fetch=True)
+        if not rows:
+            return rows
+        settled = next((i for i, row in enumerate(rows) if not row['settled']), len(rows))
+        return rows[:settled]
+
+    def get_rollup_watermark(self, name='chat_history'):
+        """Last chat_history id folded into the stats tables"""
+        query = "SELECT last_id FROM chat_rollup_state WHERE name = %s"
+        results = self.execute_query(query, (name,), fetch=True)
+        if results is None:
+            return None
+        return results[0]['last_id'] if results else 0
+
+    def save_chat_rollup(self, previous_id, last_id, daily, confidence, faqs, unmatched, name='chat_history'):
+        """Add per-day aggregates of the history rows after previous_id, up to
+        last_id, and advance the watermark in one transaction
+
+        daily holds (day, questions, answered, confidence_sum), confidence
+        (day, bucket, count), faqs (day, faq_id, count) and unmatched
+        (day, question_hash, question, count) rows. Returns the number of
+        stats rows written, 0 if another worker already rolled this range up,
+        or None on error.
+        """
+        statements = [
+            ("""
+            INSERT INTO chat_stats_daily (day, questions, answered, confidence_sum)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE questions = questions + VALUES(questions),
+                answered = answered + VALUES(answered), confidence_sum = confidence_sum + VALUES(confidence_sum)
+            """, daily),
+            ("""
+            INSERT INTO chat_stats_confidence (day, bucket, count) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE count = count + VALUES(count)
+            """, confidence),
+            ("""
+            INSERT INTO chat_stats_faqs (day, faq_id, count) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE count = count + VALUES(count)
+            """, faqs),
+            ("""
+            INSERT INTO chat_stats_unmatched (day, question_hash, question, count) VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE count = count + VALUES(count)
+            """, unmatched)
+        ]
+
+        def work(cursor):
+            # The row lock serializes workers rolling up at the same time
+            cursor.execute("SELECT last_id FROM chat_rollup_state WHERE name = %s FOR UPDATE", (name,))
+            row = cursor.fetchone()
+            if (row['last_id'] if row else 0) != previous_id:
+                return 0
+            written = 0
+            for query, rows in statements:
+                if rows:
+                    cursor.executemany(query, rows)
+                    written += len(rows)
+            cursor.execute(
+                "UPDATE chat_rollup_state SET last_id = %s WHERE name = %s", (last_id, name)
+            )
+            return written
+
+        return self.run_transaction(work, operation='rollup')
+
+    def expire_chat_history(self, days, through_id, limit, archive=True):
+        """Move up to limit history rows older than days, with ids up to
+        through_id, to chat_history_archive (or delete them if not archive)
+
+        Returns the number of rows removed from chat_history, or None on error.
+        """
+        query = """
+        SELECT id FROM chat_history
+        WHERE created_at < NOW() - INTERVAL %s DAY AND id <= %s
+        ORDER BY created_at, id
+        LIMIT %s
+        """
+        rows = self.execute_query(query, (days, through_id, limit), fetch=True)
+        if not rows:
+            return rows if rows is None else 0
+        ids = [row['id'] for row in rows]
+        placeholders = ', '.join(['%s'] * len(ids))
+
+        def work(cursor):
+            if archive:
+                cursor.execute(
+                    f"INSERT IGNORE INTO chat_history_archive ({CHAT_HISTORY_COLUMNS}) "
+                    f"SELECT {CHAT_HISTORY_COLUMNS} FROM chat_history WHERE id IN ({placeholders})", ids
+                )
+            cursor.execute(f"DELETE FROM chat_history WHERE id IN ({placeholders})", ids)
+            return cursor.rowcount
+
+        return self.run_transaction(work, operation='expire')
+
+    def get_daily_stats(self, days):
+        """Rolled-up question counts for the last days days, oldest first"""
+        query = """
+        SELECT day, questions, answered, confidence_sum FROM chat_stats_daily
+        WHERE day > CURDATE() - INTERVAL %s DAY
+        ORDER BY day
+        """
+        return self.execute_query(query, (days,), fetch=True)
+
+    def get_confidence_histogram(self, days):
+        query = """
+        SELECT bucket, SUM(count) AS count FROM chat_stats_confidence
+        WHERE day > CURDATE() - INTERVAL %s DAY
+        GROUP BY bucket
+        ORDER BY bucket
+        """
+        return self.execute_query(query, (days,), fetch=True)
+
+    def get_top_matched_faqs(self, days, limit):
+        query = """
+        SELECT s.faq_id, f.question, SUM(s.count) AS count
+        FROM chat_stats_faqs s LEFT JOIN faqs f ON f.id = s.faq_id
+        WHERE s.day > CURDATE() - INTERVAL %s DAY
+        GROUP BY s.faq_id, f.question
+        ORDER BY count DESC, s.faq_id
+        LIMIT %s
+        """
+        return self.execute_query(query, (days, limit), fetch=True)
+
+    def get_top_unmatched_questions(self, days, limit):
+        query = """
+        SELECT MIN(question) AS question, SUM(count) AS count FROM chat_stats_unmatched
+        WHERE day > CURDATE() - INTERVAL %s DAY
+        GROUP BY question_hash
+        ORDER BY count DESC, question
+        LIMIT %s
+        """
+        return self.execute_query(query, (days, limit), fetch=True)
@@ -1,160 +1,240 @@
 import pandas as pd
+import codecs
+import itertools
 import json
+import math
 from database import Database
+from config import Config
+from models.nlp_model import question_hash
 import os
+import sys
+
+try:
+    import ijson
+except ImportError:  # JSON files are then parsed in one go
+    ijson = None
+
+# Tried in order against a sample of the file; latin1 accepts any byte sequence
+ENCODINGS = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
+
+# Bytes read from the start of a file to pick its encoding
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+def detect_encoding(file_path, encodings=ENCODINGS):
+    """Pick the first encoding that decodes a sample of the file"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(ENCODING_SAMPLE_SIZE)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    for encoding in encodings:
+        try:
+            # final=False tolerates a multi-byte character cut off by the sample
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+def clean_value(value):
+    """Stripped string for a cell, or None when it is missing or blank"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return str(value).strip() or None
 
 class FAQImporter:
-    def __init__(self):
-        self.db = Database()
+    """Stream FAQs from a file into the database in batches
+
+    Rows are read in chunks, deduplicated by normalized question against the
+    database and the rest of the file, and inserted batch_size rows per
+    transaction. When a matcher is given it is refreshed once at the end.
+    """
+
+    def __init__(self, database=None, matcher=None, batch_size=Config.IMPORT_BATCH_SIZE, progress=None):
+        self.db = database or Database()
+        self.matcher = matcher
+        self.batch_size = batch_size
+        # Optional callable receiving the running stats after every batch
+        self.progress = progress
 
     def import_from_csv(self, file_path):
         """Import FAQs from CSV file with proper encoding handling"""
         try:
-            # Try different encodings
-            encodings = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
-            
-            for encoding in encodings:
-                try:
-                    df = pd.read_csv(file_path, encoding=encoding)
-                    print(f"Successfully read CSV with {encoding} encoding")
-                    break
-                except UnicodeDecodeError:
-                    continue
+            encoding = detect_encoding(file_path)
+            if encoding:
+                print(f"Reading CSV with {encoding} encoding")
             else:
-                # If all encodings fail, try without specifying encoding
-                df = pd.read_csv(file_path, encoding_errors='ignore')
-                print("Read CSV with encoding errors ignored")
-            
-            # Check if required columns exist
-            required_columns = ['question', 'answer']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                print(f"Missing columns: {missing_columns}")
-                print(f"Available columns: {list(df.columns)}")
-                return
-            
-            imported_count = 0
-            for _, row in df.iterrows():
-                # Skip rows with empty questions or answers
-                if pd.notna(row['question']) and pd.notna(row['answer']):
-                    self.db.insert_faq(
-                        question=str(row['question']).strip(),
-                        answer=str(row['answer']).strip(),
-                        category=str(row['category']).strip() if 'category' in df.columns and pd.notna(row.get('category')) else None
-                    )
-                    imported_count += 1
-            
-            print(f"Imported {imported_count} FAQs from CSV")
-            
+                print("Reading CSV with encoding errors ignored")
+
+            # Bytes the sample did not cover are replaced rather than aborting
+            # an import halfway through
+            chunks = pd.read_csv(
+                file_path,
+                encoding=encoding or 'utf-8',
+                encoding_errors='replace' if encoding else 'ignore',
+                chunksize=self.batch_size
+            )
+            first = next(chunks, None)
+            if first is None or not self._has_required_columns(first):
+                return None
+
+            rows = itertools.chain.from_iterable(
+                self._frame_rows(chunk) for chunk in itertools.chain([first], chunks)
+            )
+            return self._import_rows(rows, 'CSV')
+
         except Exception as e:
             print(f"Error importing from CSV: {e}")
 
     def import_from_excel(self, file_path):
         """Import FAQs from Excel file"""
         try:
+            # Excel workbooks cannot be read incrementally; inserts are still batched
             df = pd.read_excel(file_path)
-            
-            # Check if required columns exist
-            required_columns = ['question', 'answer']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                print(f"Missing columns: {missing_columns}")
-                print(f"Available columns: {list(df.columns)}")
-                return
-            
-            imported_count = 0
-            for _, row in df.iterrows():
-                # Skip rows with empty questions or answers
-                if pd.notna(row['question']) and pd.notna(row['answer']):
-                    self.db.insert_faq(
-                        question=str(row['question']).strip(),
-                        answer=str(row['answer']).strip(),
-                        category=str(row['category']).strip() if 'category' in df.columns and pd.notna(row.get('category')) else None
-                    )
-                    imported_count += 1
-            
-            print(f"Imported {imported_count} FAQs from Excel")
-            
+            if not self._has_required_columns(df):
+                return None
+            return self._import_rows(self._frame_rows(df), 'Excel')
+
         except Exception as e:
             print(f"Error importing from Excel: {e}")
 
     def import_from_json(self, file_path):
         """Import FAQs from JSON file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                faqs = json.load(f)
-            
-            # Handle both list format and object format
-            if isinstance(faqs, dict):
-                # Convert dict to list if needed
-                faqs = list(faqs.values())
-            
-            imported_count = 0
-            for faq in faqs:
-                if isinstance(faq, dict) and 'question' in faq and 'answer' in faq:
-                    self.db.insert_faq(
-                        question=str(faq['question']).strip(),
-                        answer=str(faq['answer']).strip(),
-                        category=str(faq['category']).strip() if 'category' in faq and faq['category'] else None
-                    )
-                    imported_count += 1
-            
-            print(f"Imported {imported_count} FAQs from JSON")
-            
+            def rows():
+                with open(file_path, 'rb') as f:
+                    for faq in self._json_items(f):
+                        if isinstance(faq, dict) and 'question' in faq and 'answer' in faq:
+                            yield faq['question'], faq['answer'], faq.get('category') or None
+
+            return self._import_rows(rows(), 'JSON')
+
         except Exception as e:
             print(f"Error importing from JSON: {e}")
 
     def import_from_text(self, file_path, delimiter="|"):
         """Import FAQs from text file with custom delimiter"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            imported_count = 0
-            for line in lines:
-                if delimiter in line:
-                    parts = line.strip().split(delimiter)
-                    if len(parts) >= 2:
-                        question = parts[0].strip()
-                        answer = parts[1].strip()
-                        category = parts[2].strip() if len(parts) > 2 else None
-                        
-                        if question and answer:  # Only import if both fields are non-empty
-                            self.db.insert_faq(question, answer, category)
-                            imported_count += 1
-            
-            print(f"Imported {imported_count} FAQs from text file")
-            
+            encoding = detect_encoding(file_path) or 'utf-8'
+
+            def rows():
+                with open(file_path, 'r', encoding=encoding, errors='replace') as f:
+                    for line in f:
+                        if delimiter in line:
+                            parts = line.strip().split(delimiter)
+                            if len(parts) >= 2:
+                                yield parts[0], parts[1], parts[2] if len(parts) > 2 else None
+
+            return self._import_rows(rows(), 'text file')
+
         except Exception as e:
             print(f"Error importing from text file: {e}")
 
     def auto_import(self, file_path):
         """Automatically detect file type and import"""
         file_extension = os.path.splitext(file_path)[1].lower()
-        
+
         if file_extension == '.csv':
-            self.import_from_csv(file_path)
+            return self.import_from_csv(file_path)
         elif file_extension in ['.xlsx', '.xls']:
-            self.import_from_excel(file_path)
+            return self.import_from_excel(file_path)
         elif file_extension == '.json':
-            self.import_from_json(file_path)
+            return self.import_from_json(file_path)
         elif file_extension == '.txt':
-            self.import_from_text(file_path)
+            return self.import_from_text(file_path)
         else:
             print(f"Unsupported file format: {file_extension}")
             print("Supported formats: .csv, .xlsx, .xls, .json, .txt")
 
+    def _has_required_columns(self, df):
+        required_columns = ['question', 'answer']
+        missing_columns = [col for col in required_columns if col not in df.columns]
+
+        if missing_columns:
+            print(f"Missing columns: {missing_columns}")
+            print(f"Available columns: {list(df.columns)}")
+            return False
+        return True
+
+    def _frame_rows(self, df):
+        categories = df['category'] if 'category' in df.columns else [None] * len(df)
+        return zip(df['question'], df['answer'], categories)
+
+    def _json_items(self, f):
+        """Yield FAQ objects from a JSON list or object, streaming with ijson
+        when it is installed"""
+        if ijson is None:
+            faqs = json.load(f)
+            # Handle both list format and object format
+            yield from faqs.values() if isinstance(faqs, dict) else faqs
+            return
+
+        # Peek at the first significant byte to tell a list from an object
+        head = f.read(ENCODING_SAMPLE_SIZE)
+        f.seek(0)
+        if head.lstrip(codecs.BOM_UTF8 + b' \t\r\n')[:1] == b'{':
+            for _, faq in ijson.kvitems(f, ''):
+                yield faq
+        else:
+            yield from ijson.items(f, 'item')
+
+    def _load_seen_hashes(self):
+        """Normalized-question hashes of the FAQs already in the database"""
+        return {question_hash(row['question']) for row in self.db.get_faq_questions() or []}
+
+    def _import_rows(self, rows, source):
+        """Deduplicate and insert (question, answer, category) rows in batches"""
+        stats = {'imported': 0, 'duplicates': 0, 'skipped': 0, 'failed': 0}
+        seen = self._load_seen_hashes()
+        batch = []
+
+        def flush():
+            inserted = self.db.insert_faqs(batch, self.batch_size)
+            if inserted is None:
+                stats['failed'] += len(batch)
+            else:
+                stats['imported'] += len(batch)
+            batch.clear()
+            print(f"{source}: imported {stats['imported']}, duplicates {stats['duplicates']}, "
+                  f"skipped {stats['skipped']}, failed {stats['failed']}")
+            if self.progress:
+                self.progress(dict(stats))
+
+        for question, answer, category in rows:
+            question, answer, category = clean_value(question), clean_value(answer), clean_value(category)
+            # Skip rows with empty questions or answers
+            if not question or not answer:
+                stats['skipped'] += 1
+                continue
+            key = question_hash(question)
+            if key in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(key)
+            batch.append((question, answer, category))
+            if len(batch) >= self.batch_size:
+                flush()
+
+        if batch:
+            flush()
+
+        print(f"Imported {stats['imported']} FAQs from {source}")
+        if self.matcher and stats['imported']:
+            # One refit for the whole import; it is published to every worker
+            self.matcher.fit()
+        return stats
+
 # Example usage
 if __name__ == "__main__":
-    importer = FAQImporter()
-    
+    from models.nlp_model import FAQMatcher
+
+    database = Database()
+    importer = FAQImporter(database, matcher=FAQMatcher(database))
+
     # Use auto_import to automatically detect file type
-    file_path = 'faq.xls'  # Change this to your actual file path
-    
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'faq.xls'  # Change this to your actual file path
+
     if os.path.exists(file_path):
         importer.auto_import(file_path)
     else:
         print(f"File not found: {file_path}")
-        print("Please make sure the file exists in the same directory")
\ No newline at end of file
+        print("Please make sure the file exists in the same directory")
@@ -0,0 +1,151 @@
+import os
+import threading
+from config import Config
+from database import LEGACY_HISTORY_WATERMARK
+from models.nlp_model import normalize_question, question_hash
+
+# Confidence histogram resolution: bucket b holds scores in [b / 10, (b + 1) / 10)
+CONFIDENCE_BUCKETS = 10
+
+# Longest normalized question kept in the unmatched question stats
+MAX_QUESTION_LENGTH = 255
+
+def confidence_bucket(confidence):
+    return min(max(int((confidence or 0.0) * CONFIDENCE_BUCKETS), 0), CONFIDENCE_BUCKETS - 1)
+
+def summarize(rows, legacy_id=0):
+    """Per-day aggregates of chat history rows, as the row lists taken by
+    Database.save_chat_rollup
+
+    Rows with ids up to legacy_id were written before matched_faq_id was
+    recorded and are classified by score instead.
+    """
+    daily, confidence, faqs, unmatched, questions = {}, {}, {}, {}, {}
+    for row in rows:
+        day = row['created_at'].date()
+        score = float(row['confidence_score'] or 0.0)
+        if row['id'] <= legacy_id:
+            answered = score > Config.ANSWER_THRESHOLD
+        else:
+            answered = row['matched_faq_id'] is not None
+
+        totals = daily.setdefault(day, [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += answered
+        totals[2] += score
+
+        key = (day, confidence_bucket(score))
+        confidence[key] = confidence.get(key, 0) + 1
+        if row['matched_faq_id'] is not None:
+            key = (day, row['matched_faq_id'])
+            faqs[key] = faqs.get(key, 0) + 1
+        elif not answered:
+            question = normalize_question(row['user_message'] or '')[:MAX_QUESTION_LENGTH]
+            if question:
+                key = (day, question_hash(question))
+                questions[key] = question
+                unmatched[key] = unmatched.get(key, 0) + 1
+
+    return {
+        'daily': [(day, *totals) for day, totals in daily.items()],
+        'confidence': [(*key, count) for key, count in confidence.items()],
+        'faqs': [(*key, count) for key, count in faqs.items()],
+        'unmatched': [(*key, questions[key], count) for key, count in unmatched.items()]
+    }
+
+class ChatHistoryRollup:
+    """Fold new chat history into the stats tables and expire old rows
+
+    Runs every `interval` seconds on a background thread, started by the
+    first start() call in each process so it survives gunicorn --preload
+    forking its workers (0 disables the thread; call run_once, e.g. from
+    cron with `python history_rollup.py`).
+    Several workers may run it at once: the watermark row lock lets only one
+    of them fold in a given range, and only rows already rolled up expire.
+    """
+
+    def __init__(self, database, interval=Config.HISTORY_ROLLUP_INTERVAL,
+                 batch_size=Config.HISTORY_ROLLUP_BATCH_SIZE,
+                 settle_seconds=Config.HISTORY_ROLLUP_SETTLE_SECONDS,
+                 retention_days=Config.HISTORY_RETENTION_DAYS,
+                 archive=Config.HISTORY_ARCHIVE):
+        self.db = database
+        self.interval = interval
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+        self.retention_days = retention_days
+        self.archive = archive
+
+        self.rolled_up = 0
+        self.expired = 0
+
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+
+    def start(self):
+        """Start this process's background thread unless it is running or disabled"""
+        if self.interval <= 0 or self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker_pid != os.getpid():
+                self._worker = threading.Thread(target=self._run, name='chat-history-rollup', daemon=True)
+                self._worker.start()
+                self._worker_pid = os.getpid()
+
+    def run_once(self):
+        """Roll up everything new, then expire; returns both row counts"""
+        return {'rolled_up': self.rollup(), 'expired': self.expire()}
+
+    def rollup(self):
+        """Fold settled history rows past the watermark into the stats tables"""
+        legacy_id = self.db.get_rollup_watermark(LEGACY_HISTORY_WATERMARK)
+        if legacy_id is None:
+            return 0
+        total = 0
+        while not self._stop.is_set():
+            last_id = self.db.get_rollup_watermark()
+            if last_id is None:
+                break
+            rows = self.db.get_chat_history_after(last_id, self.batch_size, self.settle_seconds)
+            if not rows:
+                break
+            written = self.db.save_chat_rollup(last_id, rows[-1]['id'], **summarize(rows, legacy_id))
+            if written is None:
+                break
+            # Nothing written means another worker took this range; re-read the watermark
+            if written:
+                total += len(rows)
+        self.rolled_up += total
+        return total
+
+    def expire(self):
+        """Archive (or delete) rolled-up rows older than the retention period"""
+        if self.retention_days <= 0:
+            return 0
+        through_id = self.db.get_rollup_watermark()
+        total = 0
+        while through_id and not self._stop.is_set():
+            count = self.db.expire_chat_history(self.retention_days, through_id, self.batch_size, self.archive)
+            if not count:
+                break
+            total += count
+        self.expired += total
+        return total
+
+    def close(self, timeout=10.0):
+        self._stop.set()
+        if self._worker_pid == os.getpid():
+            self._worker.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error rolling up chat history: {e}")
+
+if __name__ == '__main__':
+    from database import Database
+    print(ChatHistoryRollup(Database(), interval=0).run_once())
@@ -0,0 +1,254 @@
+import itertools
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from config import Config
+
+def process_exists(pid):
+    if os.name == 'nt':
+        # os.kill would terminate the process; never treat a file as orphaned
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+class ChatHistoryWriter:
+    """Persist chat history from a background thread in batched inserts
+
+    With the 'spill' overflow policy each process appends to its own file,
+    spill_path suffixed with its pid, so replaying and removing it never
+    races another worker's appends. Files left by processes that have exited
+    are adopted by the next worker that replays.
+
+    The background thread starts on the first submit in each process (or an
+    explicit start), so a writer created at import survives gunicorn
+    --preload forking its workers.
+    """
+
+    OVERFLOW_POLICIES = ('block', 'drop', 'spill')
+
+    def __init__(self, database, max_queue=Config.HISTORY_QUEUE_SIZE,
+                 batch_size=Config.HISTORY_BATCH_SIZE,
+                 flush_interval=Config.HISTORY_FLUSH_INTERVAL,
+                 overflow=Config.HISTORY_OVERFLOW,
+                 block_timeout=Config.HISTORY_BLOCK_TIMEOUT,
+                 spill_path=Config.HISTORY_SPILL_PATH):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+
+        self.db = database
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+
+        self._spill_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+
+    def start(self):
+        """Start this process's background thread, replaying any spill first"""
+        if self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker_pid != os.getpid():
+                self._worker = threading.Thread(target=self._run, name='chat-history-writer', daemon=True)
+                self._worker.start()
+                self._worker_pid = os.getpid()
+
+    def submit(self, user_message, bot_response, confidence_score=None, matched_faq_id=None):
+        """Queue one chat exchange for persistence without waiting on the database"""
+        if confidence_score is not None:
+            confidence_score = float(confidence_score)
+        row = (user_message, bot_response, confidence_score, matched_faq_id)
+        self.start()
+        try:
+            if self.overflow == 'block':
+                self.queue.put(row, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(row)
+        except queue.Full:
+            self._overflow([row])
+
+    def close(self, timeout=10.0):
+        """Stop accepting work and flush everything still queued"""
+        self._stop.set()
+        if self._worker_pid == os.getpid():
+            self._worker.join(timeout)
+
+    def _run(self):
+        self._replay_spill()
+        while not (self._stop.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _next_batch(self):
+        """Collect rows until the batch is full or the flush interval elapses"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if self._stop.is_set():
+                timeout = 0
+            try:
+                if timeout > 0:
+                    batch.append(self.queue.get(timeout=timeout))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        if self.db.save_chat_history_batch(batch) is None:
+            self._overflow(batch)
+            return
+        self.written += len(batch)
+        if self.overflow == 'spill' and os.path.exists(self._own_spill_path()):
+            self._replay_spill()
+
+    def _overflow(self, rows):
+        if self.overflow == 'spill':
+            self._spill(rows)
+        else:
+            self.dropped += len(rows)
+
+    def _spill(self, rows):
+        with self._spill_lock:
+            try:
+                with open(self._own_spill_path(), 'a', encoding='utf-8') as f:
+                    for row in rows:
+                        f.write(json.dumps(row) + '\n')
+                self.spilled += len(rows)
+            except OSError as e:
+                print(f"Error spilling chat history: {e}")
+                self.dropped += len(rows)
+
+    def _own_spill_path(self):
+        # Looked up per call: workers forked after construction get their own
+        return f'{self.spill_path}.{os.getpid()}'
+
+    def _replay_spill(self):
+        """Write rows spilled while the database was unavailable
+
+        The spill lock is only held to claim this process's file by renaming
+        it, so requests spilling meanwhile start a new file rather than wait
+        on the database. The claimed file is replayed outside the lock.
+        """
+        if not self.spill_path:
+            return
+        own = self._own_spill_path()
+        claimed = f'{own}.replaying'
+        self._adopt_orphaned_spills(claimed)
+        # A claimed file left by an earlier failed replay goes first, so the
+        # rename below never overwrites it
+        if not self._replay_file(claimed):
+            return
+        with self._spill_lock:
+            try:
+                os.rename(own, claimed)
+            except FileNotFoundError:
+                return
+            except OSError as e:
+                print(f"Error claiming chat history spill file: {e}")
+                return
+        self._replay_file(claimed)
+
+    def _replay_file(self, path):
+        """Insert a claimed spill file's rows batch_size at a time, then remove it
+
+        When the database fails partway the file is rewritten to hold only the
+        rows not yet written. Returns whether every row was written.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = (line for line in f if line.strip())
+                while True:
+                    chunk = list(itertools.islice(lines, self.batch_size))
+                    if not chunk:
+                        break
+                    # Rows spilled before matched_faq_id was recorded have no fourth value
+                    rows = [(*json.loads(line), None)[:4] for line in chunk]
+                    if self.db.save_chat_history_batch(rows) is None:
+                        with open(f'{path}.tmp', 'w', encoding='utf-8') as rest:
+                            rest.writelines(chunk)
+                            shutil.copyfileobj(f, rest)
+                        os.replace(f'{path}.tmp', path)
+                        return False
+                    self.written += len(rows)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error replaying chat history spill file: {e}")
+            return False
+        return True
+
+    def _adopt_orphaned_spills(self, claimed):
+        """Append rows spilled by processes that exited, or to the unsuffixed
+        file, to this process's claimed file
+
+        Each file is renamed before it is read, so only one worker adopts it.
+        """
+        directory = os.path.dirname(os.path.abspath(self.spill_path))
+        base = os.path.basename(self.spill_path)
+        try:
+            names = os.listdir(directory)
+        except OSError as e:
+            print(f"Error listing chat history spill files: {e}")
+            return
+
+        adopting = f'{self._own_spill_path()}.adopting'
+        # Finish an earlier adoption of ours that failed partway first, so the
+        # renames below never overwrite it
+        if os.path.exists(adopting) and not self._append_spill(adopting, claimed):
+            return
+        for name in names:
+            if name != base and not (name.startswith(base + '.') and self._orphaned(name[len(base) + 1:])):
+                continue
+            try:
+                os.rename(os.path.join(directory, name), adopting)
+            except FileNotFoundError:
+                # Another worker adopted it first
+                continue
+            except OSError as e:
+                print(f"Error adopting chat history spill file {name}: {e}")
+                continue
+            if not self._append_spill(adopting, claimed):
+                return
+
+    @staticmethod
+    def _append_spill(source, target):
+        """Move a spill file's rows to the end of another and remove it"""
+        try:
+            with open(source, 'r', encoding='utf-8') as src, open(target, 'a', encoding='utf-8') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(source)
+        except OSError as e:
+            print(f"Error adopting chat history spill file: {e}")
+            return False
+        return True
+
+    @staticmethod
+    def _orphaned(suffix):
+        """Whether a spill file suffix names a process that has exited:
+        '<pid>' for its spill file, '<pid>.replaying' for the file it claimed
+        and '<pid>.adopting' for one it was adopting when it exited"""
+        pid, _, state = suffix.partition('.')
+        return pid.isdigit() and state in ('', 'replaying', 'adopting') and not process_exists(int(pid))
@@ -0,0 +1,186 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond stages to slow refits
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Upper bounds of the confidence bands used to label match counters
+CONFIDENCE_BANDS = ((0.3, 'none'), (0.5, 'low'), (0.7, 'medium'), (float('inf'), 'high'))
+
+def confidence_band(confidence):
+    for upper, band in CONFIDENCE_BANDS:
+        if (confidence or 0.0) < upper:
+            return band
+    return CONFIDENCE_BANDS[-1][1]
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.family, _format_labels(self.labelnames, key), value
+
+    @property
+    def family(self):
+        """Name in HELP and TYPE lines, which must match the samples'"""
+        return self.name + '_total'
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(state[0]), state[1], state[2]) for key, state in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield (self.name + '_bucket',
+                       _format_labels(self.labelnames, key, ('le', _format_value(bound))), cumulative)
+            yield self.name + '_sum', _format_labels(self.labelnames, key), total
+            yield self.name + '_count', _format_labels(self.labelnames, key), count
+
+    @property
+    def family(self):
+        return self.name
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.family} {metric.documentation}')
+            lines.append(f'# TYPE {metric.family} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+# Metrics are per process; with several workers each one serves its own
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'faq_stage_seconds', 'Time spent in each stage of answering a question', ('stage',))
+FIT_SECONDS = REGISTRY.histogram(
+    'faq_fit_seconds', 'Duration of FAQMatcher fits', ('kind',),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'faq_db_query_seconds', 'Database statement duration by statement type', ('operation',))
+DB_ERRORS = REGISTRY.counter(
+    'faq_db_errors', 'Database statements that raised an error', ('operation',))
+MATCHES = REGISTRY.counter(
+    'faq_matches', 'Questions answered from an FAQ by method and confidence band', ('method', 'band'))
+FALLBACKS = REGISTRY.counter(
+    'faq_fallbacks', 'Questions answered with the fallback response by method', ('method',))
+REQUEST_SECONDS = REGISTRY.histogram(
+    'faq_http_request_seconds', 'HTTP request duration by endpoint and status', ('endpoint', 'status'))
+
+# Stage timings of the request being handled on this thread, for Server-Timing
+_request_timings = threading.local()
+
+def start_request_timing():
+    _request_timings.spans = []
+
+def request_timings():
+    """(stage, seconds) pairs recorded on this thread since start_request_timing"""
+    return getattr(_request_timings, 'spans', None) or []
+
+def end_request_timing():
+    spans = request_timings()
+    _request_timings.spans = None
+    return spans
+
+@contextmanager
+def timed(histogram, timing=None, **labels):
+    """Observe a block's duration in histogram, also reporting it as
+    `timing` in the current request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        spans = getattr(_request_timings, 'spans', None)
+        if timing and spans is not None:
+            spans.append((timing, elapsed))
+
+def span(stage):
+    """Time a block into faq_stage_seconds and the current request's timings"""
+    return timed(STAGE_SECONDS, stage, stage=stage)
+
+def server_timing_header(spans):
+    """Format (stage, seconds) pairs as a Server-Timing header value"""
+    totals = {}
+    for stage, elapsed in spans:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return ', '.join(f'{stage};dur={elapsed * 1000:.3f}' for stage, elapsed in totals.items())
+
+def statement_type(query):
+    """Leading SQL keyword, a bounded label for query metrics"""
+    words = query.split(None, 1)
+    return words[0].lower() if words else 'unknown'
@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+import numpy as np
+from config import Config
+
+class EncodeBatcher:
+    """Coalesce concurrent encode calls into batched model passes
+
+    Callers submit single texts and get a Future back. A worker thread
+    collects whatever arrives within max_wait_ms of the first queued text, up
+    to max_batch_size texts, encodes them in one call and resolves each
+    caller's future with its own row.
+
+    The worker thread starts on the first submit in each process, so a
+    batcher created at import survives gunicorn --preload forking workers.
+    """
+
+    def __init__(self, encode, max_batch_size=Config.ENCODE_MAX_BATCH_SIZE,
+                 max_wait_ms=Config.ENCODE_MAX_WAIT_MS, timeout_ms=Config.ENCODE_TIMEOUT_MS):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout_ms / 1000.0
+        self._queue = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+
+        self.batches = 0
+        self.encoded = 0
+        self.largest_batch = 0
+        self.peak_queue_depth = 0
+        self.timeouts = 0
+
+    def start(self):
+        """Start this process's worker thread unless it is already running"""
+        if self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker_pid != os.getpid():
+                self._worker = threading.Thread(target=self._run, name='encode-batcher', daemon=True)
+                self._worker.start()
+                self._worker_pid = os.getpid()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def submit(self, text):
+        """Queue one text for encoding, returning a Future of its embedding"""
+        self.start()
+        future = Future()
+        self._queue.put((text, future))
+        self.peak_queue_depth = max(self.peak_queue_depth, self._queue.qsize())
+        return future
+
+    def encode(self, texts):
+        """Blocking encode that shares model passes with concurrent callers
+
+        Texts the worker has not encoded within the timeout are withdrawn and
+        the whole call is encoded directly instead.
+        """
+        futures = [self.submit(text) for text in texts]
+        deadline = time.monotonic() + self.timeout
+        try:
+            return np.stack([future.result(max(deadline - time.monotonic(), 0)) for future in futures])
+        except TimeoutError:
+            for future in futures:
+                future.cancel()
+            self.timeouts += 1
+            return self._encode(texts)
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'peak_queue_depth': self.peak_queue_depth,
+            'batches': self.batches,
+            'encoded': self.encoded,
+            'largest_batch': self.largest_batch,
+            'timeouts': self.timeouts,
+            'average_batch_size': round(self.encoded / self.batches, 2) if self.batches else 0.0
+        }
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        if self._worker_pid == os.getpid():
+            self._worker.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._process(batch)
+
+    def _process(self, batch):
+        # Skip texts whose callers timed out and encoded them directly
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = self._encode(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+        self.batches += 1
+        self.encoded += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
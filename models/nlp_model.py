@@ -1,126 +1,960 @@
-import nltk
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import re
 import string
-from sentence_transformers import SentenceTransformer
-import json
+import hashlib
+import threading
+import time
+from scipy import sparse
+from config import Config
+from models.snapshot import corpus_hash, current_generation, load_snapshot, publish_lock, publish_snapshot
+from models.vector_index import FlatIndex, create_index, top_k
+from models.batching import EncodeBatcher
+from metrics import FIT_SECONDS, span
+import asyncio
+import contextlib
+import copy
+import os
 
-# Download required NLTK data
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
+# Embeddings are persisted as raw little-endian float32 bytes
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+# Values accepted for the method argument of the find_best_match* methods
+MATCH_METHODS = ('tfidf', 'semantic', 'hybrid', 'cascade')
+
+def encode_embedding(vector):
+    """Serialize an embedding vector to compact float32 bytes"""
+    return np.asarray(vector, dtype=EMBEDDING_DTYPE).tobytes()
+
+def decode_embedding(blob, dimension):
+    """Decode stored embedding bytes without copying them"""
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE, count=dimension)
+
+def content_hash(text):
+    """Stable hash of the text an embedding was computed from"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+PUNCTUATION_PATTERN = re.compile(f'[{re.escape(string.punctuation)}]')
+
+def normalize_question(text):
+    """Lowercase, strip punctuation and collapse whitespace"""
+    return ' '.join(PUNCTUATION_PATTERN.sub('', text.lower()).split())
+
+def question_hash(text):
+    """Hash identifying questions that only differ in case, punctuation or spacing"""
+    return content_hash(normalize_question(text))
+
+def row_slice(matrix, start, stop):
+    """Rows start:stop of a CSR matrix, sharing its data and indices arrays"""
+    indptr = matrix.indptr[start:stop + 1]
+    begin, end = indptr[0], indptr[-1]
+    view = sparse.csr_matrix((stop - start, matrix.shape[1]), dtype=matrix.dtype)
+    # Assigned after construction: the constructor copies small views of large
+    # arrays so they don't keep the large ones alive, which is the point here
+    view.data, view.indices, view.indptr = matrix.data[begin:end], matrix.indices[begin:end], indptr - begin
+    return view
+
+def faq_content(faq):
+    """The fields of a FAQ that its search rows and answer depend on"""
+    return faq['id'], faq['question'], faq['answer'], faq.get('category')
+
+class CategoryPartition:
+    """The FAQs of one category, searchable like a MatcherState
+
+    Holds the category's own TF-IDF rows, embeddings and vector index, so a
+    query scoped to it scans nothing else. The rows are views of the state's
+    matrices when they are contiguous, as after a full fit (FAQs are loaded
+    ordered by category), and gathered copies otherwise. rows maps partition
+    rows back to state rows.
+    """
+
+    def __init__(self, state, rows, index):
+        self.rows = rows
+        self.vectorizer = state.vectorizer
+        start, stop = int(rows[0]), int(rows[-1]) + 1
+        contiguous = stop - start == len(rows)
+        if contiguous:
+            self.faq_data = state.faq_data[start:stop]
+            self.tfidf_matrix = row_slice(state.tfidf_matrix, start, stop)
+        else:
+            self.faq_data = [state.faq_data[i] for i in rows]
+            self.tfidf_matrix = state.tfidf_matrix[rows]
+        self.index = index
+        vectors = state.embedding_matrix
+        if vectors is not None:
+            index.build(vectors[start:stop] if contiguous else vectors[rows])
+
+    @property
+    def embedding_matrix(self):
+        return self.index.vectors
+
+class PartitionGroup:
+    """Several category partitions searched together
+
+    Each partition is searched on its own and the per-partition top-k lists
+    are merged, with rows translated to the state's row numbers.
+    """
+
+    def __init__(self, state, partitions):
+        self.faq_data = state.faq_data
+        self.vectorizer = state.vectorizer
+        self.partitions = partitions
+
+class QueryEmbeddings:
+    """Normalized embeddings of a batch of questions, encoded on first use
+
+    Shared by the partitions of a PartitionGroup so each question is encoded
+    once however many partitions it is searched in.
+    """
+
+    def __init__(self, matcher, questions):
+        self.matcher = matcher
+        self.questions = questions
+        self._rows = {}
+
+    def get(self, indices):
+        missing = [i for i in indices if i not in self._rows]
+        if missing:
+            encoded = self.matcher._normalize(self.matcher._encode_queries([self.questions[i] for i in missing]))
+            self._rows.update(zip(missing, encoded))
+        return np.stack([self._rows[i] for i in indices])
+
+class MatcherState:
+    """One generation of the fitted corpus served by FAQMatcher
+
+    A state is never modified once published: updates build a new state and
+    swap it in with a single assignment, so a request that grabbed a state
+    keeps a consistent view of the FAQ rows, vectorizer and matrices.
+    """
+
+    def __init__(self, faqs, vectorizer, tfidf_matrix, index, rendered_answers, generation=None,
+                 created_at=None, content_hashes=None):
+        self.faq_data = faqs
+        self.vectorizer = vectorizer
+        self.tfidf_matrix = tfidf_matrix
+        self.index = index
+        self.rendered_answers = rendered_answers
+        self.generation = generation
+        self.created_at = created_at or time.time()
+        # Index for a category partition, given its row count; FAQMatcher
+        # replaces this with one following its settings
+        self.partition_index = lambda size: FlatIndex()
+        self.faq_index = {faq['id']: i for i, faq in enumerate(faqs)}
+        if content_hashes is None:
+            content_hashes = {faq['id']: content_hash(faq['question']) for faq in faqs}
+        self.content_hashes = content_hashes
+        self._tag = None
+        self._category_rows = None
+        self._partitions = {}
+        self._partition_lock = threading.Lock()
+        self._router = None
+
+    @property
+    def tag(self):
+        """Identifier of the served FAQ content, the same in every worker
+
+        A published generation is already unique; otherwise the rows are hashed.
+        """
+        if self.generation:
+            return self.generation
+        if self._tag is None:
+            digest = hashlib.sha256()
+            for faq in self.faq_data:
+                digest.update(repr((faq['id'], faq['question'], faq['answer'], faq.get('category'))).encode('utf-8'))
+            self._tag = digest.hexdigest()[:32]
+        return self._tag
+
+    @property
+    def embedding_matrix(self):
+        """Normalized FAQ embeddings, one row per entry of faq_data
+
+        float32, except for a quantized index fitted in this process, which
+        keeps float16 (see QuantizedIndex)
+        """
+        return self.index.vectors
+
+    @property
+    def category_rows(self):
+        """Row numbers of each category's FAQs, keyed by category"""
+        if self._category_rows is None:
+            rows = {}
+            for i, faq in enumerate(self.faq_data):
+                rows.setdefault(faq.get('category'), []).append(i)
+            self._category_rows = {category: np.array(r) for category, r in rows.items()}
+        return self._category_rows
+
+    def partition(self, categories):
+        """Partition covering the given categories, or None if none has FAQs
+
+        One category gives its CategoryPartition, built on first use and
+        kept for the lifetime of the state; several give a PartitionGroup of
+        theirs, cheap enough to build per call.
+        """
+        partitions = [
+            partition for partition in map(self.category_partition, sorted(set(categories), key=str))
+            if partition is not None
+        ]
+        if not partitions:
+            return None
+        return partitions[0] if len(partitions) == 1 else PartitionGroup(self, partitions)
+
+    def category_partition(self, category):
+        partition = self._partitions.get(category)
+        if partition is not None:
+            return partition
+        rows = self.category_rows.get(category)
+        if rows is None:
+            return None
+        with self._partition_lock:
+            partition = self._partitions.get(category)
+            if partition is None:
+                partition = CategoryPartition(self, rows, self.partition_index(len(rows)))
+                self._partitions[category] = partition
+        return partition
+
+    def build_partitions(self):
+        """Build every category's partition and the category router"""
+        for category in self.category_rows:
+            self.category_partition(category)
+        self.router()
+
+    def inherit_partitions(self, previous):
+        """Reuse the partitions of the previous state whose FAQs, rows and
+        TF-IDF weights are unchanged, so an edit only rebuilds its categories"""
+        if previous is None or not previous._partitions:
+            return
+        if previous.vectorizer is not self.vectorizer and not (
+            previous.vectorizer.vocabulary_ == self.vectorizer.vocabulary_
+            and np.array_equal(previous.vectorizer.idf_, self.vectorizer.idf_)
+        ):
+            return
+        for category, partition in previous._partitions.items():
+            rows = self.category_rows.get(category)
+            if rows is None or not np.array_equal(rows, partition.rows):
+                continue
+            if all(faq_content(self.faq_data[i]) == faq_content(faq) for i, faq in zip(rows, partition.faq_data)):
+                self._partitions[category] = partition
+
+    def router(self):
+        """Categories and their L2-normalized TF-IDF centroids, one row each"""
+        if self._router is None:
+            categories = list(self.category_rows)
+            if not categories:
+                self._router = ([], None)
+                return self._router
+            size = len(self.faq_data)
+            category_of = np.empty(size, dtype=np.int64)
+            for i, category in enumerate(categories):
+                category_of[self.category_rows[category]] = i
+            membership = sparse.csr_matrix(
+                (np.ones(size), (category_of, np.arange(size))), shape=(len(categories), size)
+            )
+            centroids = sparse.csr_matrix(membership @ self.tfidf_matrix)
+            norms = np.sqrt(np.asarray(centroids.multiply(centroids).sum(axis=1))).ravel()
+            norms[norms == 0] = 1.0
+            self._router = (categories, sparse.csr_matrix(sparse.diags(1.0 / norms) @ centroids))
+        return self._router
 
 class FAQMatcher:
-    def __init__(self, database):
+    # Questions scored per matrix product when matching in batches
+    SCORE_CHUNK_SIZE = 256
+
+    # Question hashes per embedding cache lookup query
+    CACHE_LOOKUP_CHUNK_SIZE = 1000
+
+    # Default TF-IDF settings, also part of the snapshot fingerprint
+    VECTORIZER_PARAMS = {
+        'stop_words': 'english',
+        'ngram_range': (1, Config.TFIDF_MAX_NGRAM),
+        'max_features': Config.TFIDF_MAX_FEATURES
+    }
+
+    def __init__(self, database, model_name=Config.EMBEDDING_MODEL,
+                 refit_interval=Config.TFIDF_REFIT_INTERVAL,
+                 drift_threshold=Config.TFIDF_DRIFT_THRESHOLD,
+                 renderer=None, index_type=Config.VECTOR_INDEX,
+                 snapshot_dir=Config.SNAPSHOT_DIR, sentence_model=None,
+                 snapshot_check_interval=Config.SNAPSHOT_CHECK_INTERVAL,
+                 batch_encodes=Config.ENCODE_BATCHING, vectorizer_params=None, index_options=None):
         self.db = database
-        self.vectorizer = TfidfVectorizer(
-            stop_words='english',
-            ngram_range=(1, 2),
-            max_features=5000
-        )
-        self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.tfidf_matrix = None
-        self.faq_data = []
+        self.model_name = model_name
+        # TfidfVectorizer arguments overriding VECTORIZER_PARAMS
+        self.vectorizer_params = dict(self.VECTORIZER_PARAMS, **(vectorizer_params or {}))
+        # Optional callable turning an answer into display HTML, run once per
+        # FAQ when it is loaded or changed
+        self.renderer = renderer
+        self.index_type = index_type
+        # Keyword arguments for the vector index, e.g. a quantized index's precision
+        self.index_options = index_options or {}
+        # Minimum similarity for a match to be returned
+        self.tfidf_threshold = Config.TFIDF_THRESHOLD
+        self.semantic_threshold = Config.SEMANTIC_THRESHOLD
+        # Cascade retrieval knobs, see _cascade_top_k
+        self.cascade_shortlist = Config.CASCADE_SHORTLIST
+        self.cascade_early_exit = Config.CASCADE_EARLY_EXIT
+        self.cascade_fusion = Config.CASCADE_FUSION
+        self.cascade_semantic_weight = Config.CASCADE_SEMANTIC_WEIGHT
+        self.cascade_threshold = Config.CASCADE_THRESHOLD
+        self.rrf_k = Config.CASCADE_RRF_K
+        # Category router, see route()
+        self.category_routing = Config.CATEGORY_ROUTING
+        self.router_top = Config.CATEGORY_ROUTER_TOP
+        self.router_min_score = Config.CATEGORY_ROUTER_MIN_SCORE
+        self.refit_interval = refit_interval
+        self.drift_threshold = drift_threshold
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_check_interval = snapshot_check_interval
+        self._next_snapshot_check = 0.0
+        # Loaded on first use so startup from a snapshot never touches the model
+        self._sentence_model = sentence_model
+        self._model_lock = threading.Lock()
+        # Coalesces query encodes from concurrent requests into shared batches
+        self.batcher = EncodeBatcher(lambda texts: self.sentence_model.encode(texts)) if batch_encodes else None
+        # Corpus currently served; the vector index owns the embedding matrix
+        self.state = MatcherState([], TfidfVectorizer(**self.vectorizer_params), None,
+                                  create_index(index_type, **self.index_options), {})
         self.is_fitted = False
+        self.corpus_version = 0
+        self.last_full_fit = 0.0
+        self._indexed_tokens = 0
+        self._unseen_tokens = 0
+        self._update_lock = threading.RLock()
+        # Held while a background refresh is loading a generation
+        self._refresh_lock = threading.Lock()
+        self.embedding_cache_hits = 0
+        self.embedding_cache_misses = 0
 
     def preprocess_text(self, text):
         """Clean and preprocess text"""
-        text = text.lower()
-        text = re.sub(f'[{re.escape(string.punctuation)}]', '', text)
-        text = ' '.join(text.split())
-        return text
+        return normalize_question(text)
+
+    @property
+    def sentence_model(self):
+        if self._sentence_model is None:
+            with self._model_lock:
+                if self._sentence_model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._sentence_model = SentenceTransformer(self.model_name)
+        return self._sentence_model
+
+    @sentence_model.setter
+    def sentence_model(self, model):
+        self._sentence_model = model
+
+    # Read-only views of the current state
+    faq_data = property(lambda self: self.state.faq_data)
+    vectorizer = property(lambda self: self.state.vectorizer)
+    tfidf_matrix = property(lambda self: self.state.tfidf_matrix)
+    index = property(lambda self: self.state.index)
+    embedding_matrix = property(lambda self: self.state.embedding_matrix)
+    rendered_answers = property(lambda self: self.state.rendered_answers)
+    faq_index = property(lambda self: self.state.faq_index)
+    content_hashes = property(lambda self: self.state.content_hashes)
 
     def fit(self):
-        """Train the model on existing FAQs"""
+        """Train the model on existing FAQs
+
+        When the published snapshot was fitted on the same corpus it is
+        memory-mapped instead of re-fitting and re-encoding. Otherwise the
+        fitted state is published as a new snapshot generation for the other
+        workers to pick up.
+        """
+        with self._update_lock, self._publishing():
+            self._fit()
+
+    def _fit(self, reuse_snapshot=True):
         faqs = self.db.get_all_faqs()
         if not faqs:
             return
-        
-        self.faq_data = faqs
+
+        start = time.perf_counter()
+        fingerprint = corpus_hash(faqs, self.model_name, self.vectorizer_params)
+        # A generation built by incremental adds matches the corpus but not a
+        # fresh vocabulary, so refits for drift never reuse one
+        if reuse_snapshot and self.snapshot_dir and self._load_snapshot(fingerprint):
+            FIT_SECONDS.observe(time.perf_counter() - start, kind='snapshot')
+            return
+
         questions = [self.preprocess_text(faq['question']) for faq in faqs]
-        
+
         # TF-IDF approach
-        self.tfidf_matrix = self.vectorizer.fit_transform(questions)
+        vectorizer = TfidfVectorizer(**self.vectorizer_params)
+        tfidf_matrix = vectorizer.fit_transform(questions)
+
+        # Generate embeddings for semantic search and keep them resident
+        embeddings = self._normalize(self.generate_embeddings(faqs))
+
+        index = create_index(self.index_type, **self.index_options)
+        index.build(embeddings)
+        state = MatcherState(faqs, vectorizer, tfidf_matrix, index, self._render_answers(faqs))
+        self._publish(state, full_fit=True)
+        FIT_SECONDS.observe(time.perf_counter() - start, kind='full')
+
+    def _publishing(self):
+        """Hold the cross-worker publish lock while reading, updating and
+        publishing a generation, so concurrent edits are never lost"""
+        return publish_lock(self.snapshot_dir) if self.snapshot_dir else contextlib.nullcontext()
+
+    def refresh(self, force=False):
+        """Swap to a newer snapshot generation published by another worker
+
+        Cheap enough to call per request: it reads the CURRENT pointer at most
+        once per snapshot_check_interval seconds, and a newer generation is
+        loaded on a background thread while requests keep being served from
+        the current one. With force the check and the swap happen right away;
+        returns True when the swap happened in the call.
+        """
+        if not self.snapshot_dir:
+            return False
+        now = time.monotonic()
+        if not force and now < self._next_snapshot_check:
+            return False
+        self._next_snapshot_check = now + self.snapshot_check_interval
+
+        generation = current_generation(self.snapshot_dir)
+        if not generation or generation == self.state.generation:
+            return False
+        if force:
+            with self._update_lock:
+                return self._swap_generation(generation)
+        if self._refresh_lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh_in_background, args=(generation,),
+                             name='matcher-refresh', daemon=True).start()
+        return False
+
+    def _refresh_in_background(self, generation):
+        try:
+            with self._update_lock:
+                self._swap_generation(generation)
+        except Exception as e:
+            print(f"Error loading matcher snapshot: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def _swap_generation(self, generation):
+        if generation == self.state.generation:
+            return False
+        return self._load_snapshot(generation=generation)
+
+    def _load_snapshot(self, fingerprint=None, generation=None):
+        snapshot = load_snapshot(self.snapshot_dir, fingerprint, generation)
+        if snapshot is None:
+            return False
+
+        vectorizer = TfidfVectorizer(**self.vectorizer_params)
+        vectorizer.vocabulary_ = snapshot['vocabulary']
+        vectorizer.idf_ = snapshot['idf']
+        index = create_index(self.index_type, **self.index_options)
+        if not index.load(os.path.join(snapshot['directory'], 'index'), snapshot['embeddings']):
+            index.build(snapshot['embeddings'])
+        faqs = snapshot['faqs']
+        rendered_answers = snapshot['rendered_answers']
+        if rendered_answers is None or not self.renderer:
+            rendered_answers = self._render_answers(faqs)
+        state = MatcherState(faqs, vectorizer, snapshot['tfidf_matrix'], index,
+                             rendered_answers, snapshot['generation'],
+                             snapshot['meta'].get('created_at'), snapshot['content_hashes'])
+        self._prepare_partitions(state)
+        self.state = state
+        self._restore_drift(snapshot['meta'])
+        self.is_fitted = True
+        self.corpus_version += 1
+        return True
+
+    def _publish(self, state, full_fit=False):
+        """Serve a newly built state and share it with the other workers
+
+        Raises OSError when the snapshot cannot be published: serving the
+        state anyway would only last until the next refresh swapped back to
+        the published generation, silently dropping the change.
+        """
+        if full_fit:
+            drift = {'last_full_fit': time.time(), 'indexed_tokens': 0, 'unseen_tokens': 0}
+        else:
+            drift = {'last_full_fit': self.last_full_fit, 'indexed_tokens': self._indexed_tokens,
+                     'unseen_tokens': self._unseen_tokens}
+        if self.snapshot_dir:
+            try:
+                state.generation = publish_snapshot(
+                    self.snapshot_dir,
+                    corpus_hash(state.faq_data, self.model_name, self.vectorizer_params),
+                    state.faq_data, state.vectorizer, state.tfidf_matrix,
+                    state.embedding_matrix, keep=Config.SNAPSHOT_KEEP,
+                    extra_meta=drift, index=state.index,
+                    rendered_answers=state.rendered_answers if self.renderer else None,
+                    content_hashes=state.content_hashes
+                )
+            except OSError as e:
+                print(f"Error publishing matcher snapshot: {e}")
+                raise
+
+        self._prepare_partitions(state)
+        self.state = state
+        self._restore_drift(drift)
         self.is_fitted = True
-        
-        # Generate embeddings for semantic search
-        self.generate_embeddings()
+        self.corpus_version += 1
+
+    def _prepare_partitions(self, state):
+        """Carry over unchanged category partitions from the served state and,
+        with CATEGORY_PARTITIONS, build the rest before the state is served"""
+        state.partition_index = self._partition_index
+        state.inherit_partitions(self.state)
+        if Config.CATEGORY_PARTITIONS:
+            state.build_partitions()
+
+    def _partition_index(self, size):
+        """Index for a category partition: small ones are searched exactly"""
+        if size < Config.CATEGORY_INDEX_MIN_ROWS:
+            return FlatIndex()
+        return create_index(self.index_type, **self.index_options)
+
+    def _restore_drift(self, meta):
+        """Continue the drift counts of a loaded generation, so loading or
+        swapping snapshots never postpones a due refit"""
+        self.last_full_fit = meta.get('last_full_fit', meta.get('created_at') or 0.0)
+        self._indexed_tokens = meta.get('indexed_tokens', 0)
+        self._unseen_tokens = meta.get('unseen_tokens', 0)
+
+    def add_faqs(self, faqs):
+        """Index new or changed FAQs without re-fitting the whole corpus
+
+        Only questions whose content hash is new are encoded. The TF-IDF
+        vocabulary is kept and re-fitted in full once the refit interval has
+        passed or too many new tokens fall outside it. The result is published
+        as a new snapshot generation so every worker serves the edit.
+        """
+        if not faqs:
+            return
+        with self._update_lock, self._publishing():
+            self._add_faqs(faqs)
+
+    def _add_faqs(self, faqs):
+        start = time.perf_counter()
+        # Build on the latest generation, which another worker may have published
+        self.refresh(force=True)
+        if not self.is_fitted:
+            self._fit()
+            return
+
+        state = self.state
+        faq_data = list(state.faq_data)
+        new_faqs, changed_faqs = [], []
+        for faq in faqs:
+            if faq['id'] not in state.faq_index:
+                new_faqs.append(faq)
+            elif content_hash(faq['question']) != state.content_hashes[faq['id']]:
+                changed_faqs.append(faq)
+            else:
+                # Same question text, so only the stored answer/category changes
+                faq_data[state.faq_index[faq['id']]] = faq
+
+        pending = new_faqs + changed_faqs
+        if pending:
+            questions = [self.preprocess_text(faq['question']) for faq in pending]
+            self._track_vocabulary_drift(state.vectorizer, questions)
+            if self._needs_full_refit():
+                self._fit(reuse_snapshot=False)
+                return
+
+        tfidf_matrix = state.tfidf_matrix
+        index = copy.copy(state.index)
+        if pending:
+            question_vectors = state.vectorizer.transform(questions)
+            embeddings = self._normalize(self.encode_questions([faq['question'] for faq in pending]))
+
+            if changed_faqs:
+                rows = [state.faq_index[faq['id']] for faq in changed_faqs]
+                offset = len(new_faqs)
+                tfidf_matrix = tfidf_matrix.tolil()
+                tfidf_matrix[rows] = question_vectors[offset:]
+                tfidf_matrix = tfidf_matrix.tocsr()
+                index.update(rows, embeddings[offset:])
+                for row, faq in zip(rows, changed_faqs):
+                    faq_data[row] = faq
 
-    def generate_embeddings(self):
+            if new_faqs:
+                count = len(new_faqs)
+                faq_data.extend(new_faqs)
+                tfidf_matrix = sparse.vstack([tfidf_matrix, question_vectors[:count]], format='csr')
+                index.add(embeddings[:count])
+
+        rendered_answers = dict(state.rendered_answers)
+        rendered_answers.update(self._render_answers(faqs))
+        self._publish(MatcherState(faq_data, state.vectorizer, tfidf_matrix, index, rendered_answers))
+        FIT_SECONDS.observe(time.perf_counter() - start, kind='incremental')
+
+    def update_faq(self, faq):
+        """Re-index a single edited FAQ"""
+        self.add_faqs([faq])
+
+    def _render_answers(self, faqs):
+        if not self.renderer:
+            return {}
+        return {faq['id']: self.renderer(faq['answer']) for faq in faqs}
+
+    def rendered_answer(self, faq):
+        """Display HTML for a FAQ answer, rendered at load time when possible"""
+        rendered = self.state.rendered_answers.get(faq['id'])
+        if rendered is None:
+            return self.renderer(faq['answer']) if self.renderer else faq['answer']
+        return rendered
+
+    def _track_vocabulary_drift(self, vectorizer, questions):
+        """Count how many incoming words the fitted vocabulary does not know
+
+        Only unigrams count: most bigrams of a new question are unseen even
+        when every word in it is known.
+        """
+        analyzer = vectorizer.build_analyzer()
+        vocabulary = vectorizer.vocabulary_
+        for question in questions:
+            tokens = [token for token in analyzer(question) if ' ' not in token]
+            self._indexed_tokens += len(tokens)
+            self._unseen_tokens += sum(1 for token in tokens if token not in vocabulary)
+
+    def _needs_full_refit(self):
+        if time.time() - self.last_full_fit > self.refit_interval:
+            return True
+        if not self._indexed_tokens:
+            return False
+        return self._unseen_tokens / self._indexed_tokens > self.drift_threshold
+
+    def generate_embeddings(self, faqs):
         """Generate sentence embeddings for FAQs"""
-        questions = [faq['question'] for faq in self.faq_data]
-        embeddings = self.sentence_model.encode(questions)
-        
-        # Store embeddings in database
-        for i, faq in enumerate(self.faq_data):
-            embedding_json = json.dumps(embeddings[i].tolist())
-            query = """
-            INSERT INTO faq_embeddings (faq_id, embedding)
-            VALUES (%s, %s) 
-            ON DUPLICATE KEY UPDATE embedding = %s
+        questions = [faq['question'] for faq in faqs]
+        return self.encode_questions(questions)
+
+    def encode_questions(self, questions):
+        """Embed FAQ questions, encoding only texts not yet cached for this model
+
+        The cache is content-addressed by (model name, question hash), so
+        re-fits, re-imports and FAQs sharing a question reuse earlier work.
+        """
+        hashes = [content_hash(question) for question in questions]
+        with span('embedding_fetch'):
+            cached = self._load_cached_embeddings(set(hashes))
+
+        missing = {}
+        for question, key in zip(questions, hashes):
+            if key not in cached:
+                missing.setdefault(key, question)
+        if missing:
+            encoded = np.asarray(self.sentence_model.encode(list(missing.values())), dtype=np.float32)
+            self._cache_embeddings(list(missing), encoded)
+            cached.update(zip(missing, encoded))
+
+        self.embedding_cache_hits += len(questions) - len(missing)
+        self.embedding_cache_misses += len(missing)
+        return np.stack([cached[key] for key in hashes])
+
+    def _load_cached_embeddings(self, hashes):
+        """Cached embeddings for the given question hashes, keyed by hash"""
+        hashes = list(hashes)
+        cached = {}
+        for start in range(0, len(hashes), self.CACHE_LOOKUP_CHUNK_SIZE):
+            chunk = hashes[start:start + self.CACHE_LOOKUP_CHUNK_SIZE]
+            query = f"""
+            SELECT question_hash, dimension, embedding FROM embedding_cache
+            WHERE model_name = %s AND question_hash IN ({', '.join(['%s'] * len(chunk))})
             """
-            self.db.execute_query(query, (faq['id'], embedding_json, embedding_json))
+            results = self.db.execute_query(query, (self.model_name, *chunk), fetch=True) or []
+            cached.update(
+                (row['question_hash'], decode_embedding(row['embedding'], row['dimension']))
+                for row in results
+                if row['embedding'] and len(row['embedding']) == row['dimension'] * EMBEDDING_DTYPE.itemsize
+            )
+        return cached
+
+    def _cache_embeddings(self, hashes, embeddings):
+        """Bulk insert freshly encoded embeddings into the shared cache"""
+        dimension = int(embeddings.shape[1])
+        rows = [
+            (self.model_name, key, dimension, encode_embedding(embeddings[i]))
+            for i, key in enumerate(hashes)
+        ]
+        query = """
+        INSERT INTO embedding_cache (model_name, question_hash, dimension, embedding)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            dimension = VALUES(dimension),
+            embedding = VALUES(embedding)
+        """
+        self.db.execute_many(query, rows)
+
+    @staticmethod
+    def _normalize(vectors):
+        """L2-normalize row vectors as float32 so dot products are cosine scores"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
 
-    def find_best_match(self, user_question, method='hybrid'):
-        """Find the best matching FAQ"""
+    def _encode_queries(self, questions):
+        """Encode user questions, sharing a model pass with concurrent requests
+        when batching is enabled; large batches are encoded directly"""
+        with span('encode'):
+            if self.batcher and len(questions) <= self.batcher.max_batch_size:
+                return self.batcher.encode(questions)
+            return self.sentence_model.encode(questions)
+
+    async def find_best_match_async(self, user_question, method='hybrid', categories=None):
+        """find_best_match for asyncio/ASGI handlers
+
+        Scoring runs in the loop's default executor; concurrent calls still
+        meet in the encode batcher.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.find_best_match, user_question, method, categories)
+
+    def find_best_match(self, user_question, method='hybrid', categories=None):
+        """Find the best matching FAQ, optionally within the given categories"""
         if not self.is_fitted or not self.faq_data:
             return None, 0.0
 
-        processed_question = self.preprocess_text(user_question)
-        
-        if method == 'tfidf':
-            return self._tfidf_match(processed_question)
-        elif method == 'semantic':
-            return self._semantic_match(user_question)
-        else:  # hybrid
-            tfidf_match, tfidf_score = self._tfidf_match(processed_question)
-            semantic_match, semantic_score = self._semantic_match(user_question)
-            
-            # Prefer higher confidence match
-            if tfidf_score >= semantic_score:
-                return tfidf_match, tfidf_score
+        return self.find_best_matches([user_question], method, categories=categories)[0][0]
+
+    def find_best_matches(self, questions, method='hybrid', top_k=1, categories=None):
+        """Find the best matching FAQs for a batch of questions in one pass
+
+        Returns one list per question holding up to top_k (faq, score) pairs,
+        best first. As with find_best_match, faq is None when the score does
+        not clear the threshold of the method that produced it.
+
+        categories (a name or a list) limits every question to those
+        categories' FAQs. Without it, and with category routing on, each
+        question is scored against the categories the router predicts.
+        """
+        if not questions:
+            return []
+        self.refresh()
+        state = self.state
+        if not self.is_fitted or not state.faq_data:
+            return [[(None, 0.0)] for _ in questions]
+
+        if categories is not None:
+            partition = state.partition([categories] if isinstance(categories, str) else categories)
+            if partition is None:
+                return [[(None, 0.0)] for _ in questions]
+            return self._match(partition, questions, method, top_k)
+        if self.category_routing:
+            return self._match_routed(state, questions, method, top_k)
+        return self._match(state, questions, method, top_k)
+
+    def route(self, questions, state=None):
+        """Predict the categories worth searching for each question
+
+        Returns a tuple of up to router_top categories per question, or None
+        when no category centroid is similar enough to rule the others out.
+        """
+        state = state or self.state
+        categories, centroids = state.router()
+        if centroids is None or len(categories) < 2:
+            return [None] * len(questions)
+
+        with span('route'):
+            processed_questions = [self.preprocess_text(q) for q in questions]
+            scores = (state.vectorizer.transform(processed_questions) @ centroids.T).toarray()
+            indices, scores = top_k(scores, min(self.router_top, len(categories)))
+        routes = []
+        for row_indices, row_scores in zip(indices, scores):
+            if row_scores[0] < self.router_min_score:
+                routes.append(None)
             else:
-                return semantic_match, semantic_score
-
-    def _tfidf_match(self, processed_question):
-        """Match using TF-IDF cosine similarity"""
-        question_vector = self.vectorizer.transform([processed_question])
-        similarities = cosine_similarity(question_vector, self.tfidf_matrix)
-        
-        best_match_idx = np.argmax(similarities[0])
-        best_score = similarities[0][best_match_idx]
-        
-        if best_score > 0.3:  # Threshold
-            return self.faq_data[best_match_idx], best_score
-        return None, best_score
-
-    def _semantic_match(self, user_question):
-        """Match using semantic similarity"""
-        user_embedding = self.sentence_model.encode([user_question])
-        
-        # Get embeddings from database
-        query = "SELECT fe.faq_id, fe.embedding, f.question, f.answer FROM faq_embeddings fe JOIN faqs f ON fe.faq_id = f.id"
-        results = self.db.execute_query(query, fetch=True)
-        
-        if not results:
-            return None, 0.0
-        
-        best_match = None
-        best_score = 0.0
-        
-        for result in results:
-            faq_embedding = np.array(json.loads(result['embedding']))
-            similarity = cosine_similarity([user_embedding[0]], [faq_embedding])[0][0]
-            
-            if similarity > best_score:
-                best_score = similarity
-                best_match = {
-                    'id': result['faq_id'],
-                    'question': result['question'],
-                    'answer': result['answer']
-                }
-        
-        if best_score > 0.5:  # Higher threshold for semantic matching
-            return best_match, best_score
-        return None, best_score
\ No newline at end of file
+                routes.append(tuple(
+                    categories[idx] for idx, score in zip(row_indices, row_scores)
+                    if score >= self.router_min_score
+                ))
+        return routes
+
+    def _match_routed(self, state, questions, method, top_k):
+        """Score each group of questions routed to the same categories together"""
+        groups = {}
+        for i, route in enumerate(self.route(questions, state)):
+            groups.setdefault(route, []).append(i)
+
+        matches = [None] * len(questions)
+        for route, members in groups.items():
+            target = state if route is None else state.partition(route)
+            for i, candidates in zip(members, self._match(target, [questions[i] for i in members], method, top_k)):
+                matches[i] = candidates
+        return matches
+
+    def _match(self, state, questions, method, top_k):
+        """Score questions against a state, a category partition or a group
+        of partitions"""
+        faq_data = state.faq_data
+        queries = QueryEmbeddings(self, questions)
+        if method == 'cascade':
+            return [
+                [(faq_data[idx] if idx is not None and score > self.cascade_threshold else None, score)
+                 for idx, score in candidates]
+                for candidates in self._cascade_top_k(state, questions, top_k, queries)
+            ]
+
+        tfidf_results = semantic_results = None
+        if method != 'semantic':
+            with span('preprocess'):
+                processed_questions = [self.preprocess_text(q) for q in questions]
+            tfidf_results = self._tfidf_top_k(state, processed_questions, top_k)
+        if method != 'tfidf':
+            semantic_results = self._semantic_top_k(state, questions, top_k, queries)
+
+        matches = []
+        for i in range(len(questions)):
+            if method == 'tfidf':
+                candidates, threshold = tfidf_results[i], self.tfidf_threshold
+            elif method == 'semantic':
+                candidates, threshold = semantic_results[i], self.semantic_threshold
+            # hybrid: prefer whichever method is more confident
+            elif tfidf_results[i][0][1] >= semantic_results[i][0][1]:
+                candidates, threshold = tfidf_results[i], self.tfidf_threshold
+            else:
+                candidates, threshold = semantic_results[i], self.semantic_threshold
+
+            matches.append([
+                (faq_data[idx] if idx is not None and score > threshold else None, score)
+                for idx, score in candidates
+            ])
+        return matches
+
+    def _tfidf_top_k(self, state, processed_questions, k):
+        """Rank FAQs by TF-IDF cosine similarity for each question"""
+        if isinstance(state, PartitionGroup):
+            return self._merge_partitions(state, [
+                self._tfidf_top_k(partition, processed_questions, k) for partition in state.partitions
+            ], k)
+        results = []
+        for start in range(0, len(processed_questions), self.SCORE_CHUNK_SIZE):
+            chunk = processed_questions[start:start + self.SCORE_CHUNK_SIZE]
+            with span('tfidf_transform'):
+                question_vectors = state.vectorizer.transform(chunk)
+            with span('tfidf_score'):
+                similarities = cosine_similarity(question_vectors, state.tfidf_matrix)
+                indices, scores = top_k(similarities, k)
+            results.extend(self._candidates(state, indices, scores))
+        return results
+
+    def _cascade_top_k(self, state, questions, k, queries):
+        """Shortlist FAQs with TF-IDF and rerank only the shortlist with embeddings
+
+        A question whose best TF-IDF score reaches cascade_early_exit is
+        answered from TF-IDF alone. One with no lexical overlap at all falls
+        back to a full semantic search. Everything else is encoded in a single
+        batch and its shortlist is reranked by fusing both scores.
+        """
+        if isinstance(state, PartitionGroup):
+            return self._merge_partitions(state, [
+                self._cascade_top_k(partition, questions, k, queries) for partition in state.partitions
+            ], k)
+        with span('preprocess'):
+            processed_questions = [self.preprocess_text(q) for q in questions]
+        shortlist_size = max(self.cascade_shortlist, k)
+        results = [None] * len(questions)
+        rerank = []
+
+        for start in range(0, len(processed_questions), self.SCORE_CHUNK_SIZE):
+            chunk = processed_questions[start:start + self.SCORE_CHUNK_SIZE]
+            with span('tfidf_transform'):
+                question_vectors = state.vectorizer.transform(chunk)
+            with span('tfidf_score'):
+                similarities = cosine_similarity(question_vectors, state.tfidf_matrix)
+                shortlist, tfidf_scores = top_k(similarities, shortlist_size)
+            for offset in range(len(chunk)):
+                i = start + offset
+                found = shortlist[offset] >= 0
+                rows, scores = shortlist[offset][found], tfidf_scores[offset][found]
+                if len(scores) and scores[0] >= self.cascade_early_exit:
+                    results[i] = [(int(row), float(score)) for row, score in zip(rows[:k], scores[:k])]
+                else:
+                    rerank.append((i, rows, scores))
+
+        if not rerank or not len(state.index):
+            for i, rows, scores in rerank:
+                results[i] = [(int(row), float(score)) for row, score in zip(rows[:k], scores[:k])] or [(None, 0.0)]
+            return results
+
+        embeddings = queries.get([i for i, _, _ in rerank])
+        embedding_matrix = state.embedding_matrix
+        no_overlap = []
+        for (i, rows, tfidf_scores), embedding in zip(rerank, embeddings):
+            if not len(tfidf_scores) or tfidf_scores[0] <= 0:
+                no_overlap.append((i, embedding))
+                continue
+            semantic_scores = embedding_matrix[rows] @ embedding
+            results[i] = self._fuse(rows, tfidf_scores, semantic_scores, k)
+
+        if no_overlap:
+            indices, scores = state.index.search(np.stack([e for _, e in no_overlap]), k)
+            for (i, _), candidates in zip(no_overlap, self._candidates(state, indices, scores)):
+                # Without lexical evidence the weighted score is the semantic part only
+                results[i] = [
+                    (idx, score * self.cascade_semantic_weight if idx is not None else score)
+                    for idx, score in candidates
+                ]
+        return results
+
+    def _fuse(self, rows, tfidf_scores, semantic_scores, k):
+        """Combine TF-IDF and semantic scores for a shortlist, best first
+
+        The confidence reported is always the weighted score. With reciprocal
+        rank fusion it only decides the order.
+        """
+        weight = self.cascade_semantic_weight
+        confidence = weight * semantic_scores + (1 - weight) * tfidf_scores
+        if self.cascade_fusion == 'rrf':
+            tfidf_rank = np.arange(len(rows))
+            semantic_rank = np.empty(len(rows), dtype=np.int64)
+            semantic_rank[np.argsort(-semantic_scores, kind='stable')] = np.arange(len(rows))
+            ranking = 1.0 / (self.rrf_k + tfidf_rank + 1) + 1.0 / (self.rrf_k + semantic_rank + 1)
+        else:
+            ranking = confidence
+        order = np.argsort(-ranking, kind='stable')[:k]
+        return [(int(rows[j]), float(confidence[j])) for j in order]
+
+    def _semantic_top_k(self, state, questions, k, queries):
+        """Rank FAQs by embedding cosine similarity for each question"""
+        if isinstance(state, PartitionGroup):
+            return self._merge_partitions(state, [
+                self._semantic_top_k(partition, questions, k, queries) for partition in state.partitions
+            ], k)
+        index = state.index
+        if not len(index):
+            return [[(None, 0.0)] for _ in questions]
+
+        results = []
+        for start in range(0, len(questions), self.SCORE_CHUNK_SIZE):
+            embeddings = queries.get(range(start, min(start + self.SCORE_CHUNK_SIZE, len(questions))))
+            with span('vector_search'):
+                results.extend(self._candidates(state, *index.search(embeddings, k)))
+        return results
+
+    @staticmethod
+    def _merge_partitions(group, results, k):
+        """Merge per-partition candidate lists into top-k lists of state rows"""
+        merged = []
+        for per_partition in zip(*results):
+            candidates = [
+                (int(partition.rows[idx]), score)
+                for partition, pairs in zip(group.partitions, per_partition)
+                for idx, score in pairs if idx is not None
+            ]
+            candidates.sort(key=lambda candidate: -candidate[1])
+            merged.append(candidates[:k] or [(None, 0.0)])
+        return merged
+
+    @staticmethod
+    def _candidates(state, indices, scores):
+        """Pair up top-k indices and scores as per-question lists"""
+        # An index shared with a newer state may know rows this state lacks
+        size = len(state.faq_data)
+        results = []
+        for row_indices, row_scores in zip(indices, scores):
+            candidates = [
+                (int(idx), float(score))
+                for idx, score in zip(row_indices, row_scores) if 0 <= idx < size
+            ]
+            results.append(candidates or [(None, 0.0)])
+        return results
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+import numpy as np
+from scipy import sparse
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development servers only
+    fcntl = None
+
+# Bump when the on-disk layout changes so old snapshots are ignored
+SNAPSHOT_FORMAT = 2
+
+# Name of the file pointing at the generation workers should serve
+CURRENT_FILE = 'CURRENT'
+GENERATION_PREFIX = 'gen-'
+
+def corpus_hash(faqs, model_name, vectorizer_params):
+    """Fingerprint of everything a fitted snapshot depends on
+
+    Rows are hashed in id order so the result does not depend on the order
+    FAQs were indexed in.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([SNAPSHOT_FORMAT, model_name, vectorizer_params], sort_keys=True).encode('utf-8'))
+    for faq in sorted(faqs, key=lambda faq: faq['id']):
+        row = [faq['id'], faq['question'], faq['answer'], faq.get('category')]
+        digest.update(json.dumps(row).encode('utf-8'))
+    return digest.hexdigest()
+
+@contextmanager
+def publish_lock(root):
+    """Serialize publishers across worker processes"""
+    try:
+        os.makedirs(root, exist_ok=True)
+        lock_file = open(os.path.join(root, '.lock'), 'w')
+    except OSError as e:
+        # Publishing will fail the same way and report it
+        print(f"Error opening snapshot lock: {e}")
+        yield
+        return
+
+    with lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def current_generation(root):
+    """Name of the generation currently published under root, if any"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def publish_snapshot(root, fingerprint, faqs, vectorizer, tfidf_matrix, embeddings, keep=3, extra_meta=None,
+                     index=None, rendered_answers=None, content_hashes=None):
+    """Write a fitted matcher state as a new immutable generation
+
+    extra_meta is stored in meta.json alongside the format fields, for state
+    the workers loading the generation must share. The vector index
+    structures, rendered answers ({faq id: html}) and question hashes
+    ({faq id: hash}) are optional; workers loading the generation reuse
+    them instead of rebuilding them from the FAQs.
+
+    The generation is fully written before CURRENT is atomically repointed
+    at it, so readers only ever see complete generations. Generations that
+    are no longer current are pruned down to `keep`; workers still mapping
+    a pruned one keep their open files until they swap.
+    """
+    os.makedirs(root, exist_ok=True)
+    generation = f'{GENERATION_PREFIX}{time.time_ns():020d}-{os.getpid()}'
+    staging = tempfile.mkdtemp(prefix='.staging-', dir=root)
+    try:
+        vocabulary = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        tfidf_matrix = tfidf_matrix.tocsr()
+        np.save(os.path.join(staging, 'idf.npy'), vectorizer.idf_)
+        np.save(os.path.join(staging, 'tfidf_data.npy'), tfidf_matrix.data)
+        np.save(os.path.join(staging, 'tfidf_indices.npy'), tfidf_matrix.indices)
+        np.save(os.path.join(staging, 'tfidf_indptr.npy'), tfidf_matrix.indptr)
+        np.save(os.path.join(staging, 'embeddings.npy'), np.ascontiguousarray(embeddings, dtype=np.float32))
+        with open(os.path.join(staging, 'faqs.json'), 'w', encoding='utf-8') as f:
+            json.dump(faqs, f, default=str)
+        with open(os.path.join(staging, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+            json.dump(vocabulary, f)
+        if index is not None:
+            index.save(os.path.join(staging, 'index'))
+        if rendered_answers is not None:
+            with open(os.path.join(staging, 'rendered.json'), 'w', encoding='utf-8') as f:
+                json.dump(list(rendered_answers.items()), f)
+        if content_hashes is not None:
+            with open(os.path.join(staging, 'hashes.json'), 'w', encoding='utf-8') as f:
+                json.dump(list(content_hashes.items()), f)
+        with open(os.path.join(staging, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': SNAPSHOT_FORMAT,
+                'corpus_hash': fingerprint,
+                'tfidf_shape': list(tfidf_matrix.shape),
+                'created_at': time.time(),
+                **(extra_meta or {})
+            }, f)
+        os.replace(staging, os.path.join(root, generation))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(root, f'.{CURRENT_FILE}-{os.getpid()}')
+    with open(pointer, 'w', encoding='utf-8') as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(root, CURRENT_FILE))
+
+    _prune(root, generation, keep)
+    return generation
+
+def _prune(root, current, keep):
+    generations = sorted(
+        name for name in os.listdir(root)
+        if name.startswith(GENERATION_PREFIX) and name != current
+    )
+    for name in generations[:max(len(generations) - (keep - 1), 0)]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+def read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('format') == SNAPSHOT_FORMAT else None
+
+def load_snapshot(root, fingerprint=None, generation=None):
+    """Memory-map a published generation, the current one by default
+
+    Returns None when there is no usable snapshot or, if a fingerprint is
+    given, when it was built from a different corpus.
+    """
+    generation = generation or current_generation(root)
+    if not generation:
+        return None
+    directory = os.path.join(root, generation)
+    meta = read_meta(directory)
+    if meta is None or (fingerprint and meta['corpus_hash'] != fingerprint):
+        return None
+
+    def mapped(name):
+        return np.load(os.path.join(directory, name), mmap_mode='r')
+
+    def pairs(name):
+        # Optional files: generations published without them are still usable
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return dict(json.load(f))
+
+    try:
+        with open(os.path.join(directory, 'faqs.json'), 'r', encoding='utf-8') as f:
+            faqs = json.load(f)
+        with open(os.path.join(directory, 'vocabulary.json'), 'r', encoding='utf-8') as f:
+            vocabulary = {term: i for i, term in enumerate(json.load(f))}
+
+        tfidf_matrix = sparse.csr_matrix(
+            (mapped('tfidf_data.npy'), mapped('tfidf_indices.npy'), mapped('tfidf_indptr.npy')),
+            shape=tuple(meta['tfidf_shape']),
+            copy=False
+        )
+        return {
+            'generation': generation,
+            'directory': directory,
+            'meta': meta,
+            'faqs': faqs,
+            'vocabulary': vocabulary,
+            'idf': np.load(os.path.join(directory, 'idf.npy')),
+            'tfidf_matrix': tfidf_matrix,
+            'embeddings': mapped('embeddings.npy'),
+            'rendered_answers': pairs('rendered.json'),
+            'content_hashes': pairs('hashes.json')
+        }
+    except (OSError, ValueError):
+        # Pruned between reading CURRENT and opening the files
+        return None
@@ -0,0 +1,494 @@
+import json
+import mmap
+import os
+import pickle
+import numpy as np
+from config import Config
+
+# Rows scored per matrix product when assigning vectors to IVF lists
+ASSIGN_CHUNK_SIZE = 16384
+# Quantized rows widened to float32 per matrix product; small enough that
+# the temporary stays in cache
+SCORE_CHUNK_SIZE = 1024
+
+def top_k(scores, k):
+    """Return (indices, scores) of the k highest scores in each row, best first
+
+    Rows with fewer than k candidates are padded with index -1 and -inf.
+    """
+    n = scores.shape[1]
+    if k == 1 and n:
+        # argmax keeps the lowest index on ties
+        indices = np.argmax(scores, axis=1)[:, None]
+    elif k < n:
+        indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.tile(np.arange(n), (scores.shape[0], 1))
+    top = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-top, axis=1, kind='stable')
+    indices = np.take_along_axis(indices, order, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    if indices.shape[1] < k:
+        pad = k - indices.shape[1]
+        indices = np.pad(indices, ((0, 0), (0, pad)), constant_values=-1)
+        top = np.pad(top, ((0, 0), (0, pad)), constant_values=-np.inf)
+    return indices, top
+
+def memory_mapped(array):
+    """Whether array is backed by a memory-mapped file, such as a snapshot's
+    embeddings, rather than by this process's memory"""
+    while array is not None:
+        if isinstance(array, mmap.mmap):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+class FlatIndex:
+    """Exact inner-product search over L2-normalized vectors"""
+
+    # Constructor arguments a saved index must have been built with to be reused
+    BUILD_SETTINGS = ()
+
+    def __init__(self):
+        self.vectors = None
+
+    def __len__(self):
+        return 0 if self.vectors is None else len(self.vectors)
+
+    def build(self, vectors):
+        self.vectors = vectors
+
+    def add(self, vectors):
+        """Append vectors; they take the next row numbers"""
+        self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])
+
+    def update(self, rows, vectors):
+        """Replace the vectors stored at the given rows"""
+        updated = self.vectors.copy()
+        updated[rows] = vectors
+        self.vectors = updated
+
+    def search(self, queries, k):
+        """Return (indices, scores) arrays of shape (len(queries), k)"""
+        vectors = self.vectors
+        if vectors is None or not len(vectors):
+            return top_k(np.empty((len(queries), 0), dtype=np.float32), k)
+        return top_k(queries @ vectors.T, k)
+
+    def save(self, directory):
+        """Write the search structures built over the vectors, which the
+        caller stores itself, so load can skip the build"""
+        os.makedirs(directory, exist_ok=True)
+        self._save(directory)
+        with open(os.path.join(directory, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(self._description(), f)
+
+    def load(self, directory, vectors):
+        """Restore structures written by save for these vectors, memory-mapping
+        them where possible
+
+        Returns False when there are none or they were built with other
+        settings, in which case the caller builds the index instead.
+        """
+        try:
+            with open(os.path.join(directory, 'index.json'), 'r', encoding='utf-8') as f:
+                if json.load(f) != self._description():
+                    return False
+            loaded = self._load(directory, vectors)
+        except (OSError, ValueError, RuntimeError):
+            return False
+        if loaded:
+            self.vectors = vectors
+        return loaded
+
+    def _description(self):
+        return {'type': type(self).__name__, 'settings': {name: getattr(self, name) for name in self.BUILD_SETTINGS}}
+
+    def _save(self, directory):
+        pass
+
+    def _load(self, directory, vectors):
+        return True
+
+class IVFIndex(FlatIndex):
+    """Inverted-file index: vectors are bucketed by their nearest k-means
+    centroid and a query only scans the nprobe closest buckets
+
+    Raising nprobe improves recall at the cost of latency; nprobe == nlist is
+    an exact search.
+    """
+
+    BUILD_SETTINGS = ('nlist', 'train_iterations', 'seed')
+
+    def __init__(self, nlist=Config.IVF_NLIST, nprobe=Config.IVF_NPROBE,
+                 train_iterations=10, seed=0):
+        super().__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+
+    def build(self, vectors):
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+        self.centroids = self._train(vectors, nlist)
+        assignments = self._assign(vectors)
+        self.lists = [np.flatnonzero(assignments == c) for c in range(nlist)]
+        self.vectors = vectors
+
+    def add(self, vectors):
+        if self.centroids is None:
+            self.build(vectors)
+            return
+        start = len(self)
+        super().add(vectors)
+        rows = np.arange(start, start + len(vectors))
+        self._insert(rows, self._assign(vectors))
+
+    def update(self, rows, vectors):
+        rows = np.asarray(rows)
+        super().update(rows, vectors)
+        lists = [np.setdiff1d(members, rows, assume_unique=True) for members in self.lists]
+        self._insert(rows, self._assign(vectors), lists)
+
+    def search(self, queries, k):
+        vectors = self.vectors
+        if self.centroids is None or vectors is None or not len(vectors):
+            return super().search(queries, k)
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes, _ = top_k(queries @ self.centroids.T, nprobe)
+        lists = self.lists
+
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([lists[c] for c in probes[i]])
+            if not len(candidates):
+                continue
+            top_rows, top_scores = top_k((vectors[candidates] @ query)[None, :], k)
+            found = top_rows[0] >= 0
+            indices[i, :found.sum()] = candidates[top_rows[0][found]]
+            scores[i, :found.sum()] = top_scores[0][found]
+        return indices, scores
+
+    def _save(self, directory):
+        if self.centroids is None:
+            return
+        lists = self.lists
+        np.save(os.path.join(directory, 'ivf_centroids.npy'), self.centroids)
+        np.save(os.path.join(directory, 'ivf_rows.npy'),
+                np.concatenate(lists) if lists else np.empty(0, dtype=np.int64))
+        np.save(os.path.join(directory, 'ivf_offsets.npy'), np.cumsum([0] + [len(members) for members in lists]))
+
+    def _load(self, directory, vectors):
+        rows = np.load(os.path.join(directory, 'ivf_rows.npy'), mmap_mode='r')
+        offsets = np.load(os.path.join(directory, 'ivf_offsets.npy'))
+        if offsets[-1] != len(vectors):
+            return False
+        self.centroids = np.load(os.path.join(directory, 'ivf_centroids.npy'))
+        self.lists = [rows[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+        return True
+
+    def _train(self, vectors, nlist):
+        """Spherical k-means on a sample of the vectors"""
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), nlist * 64)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.train_iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignments == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+        return centroids
+
+    def _assign(self, vectors):
+        return np.concatenate([
+            np.argmax(vectors[start:start + ASSIGN_CHUNK_SIZE] @ self.centroids.T, axis=1)
+            for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE)
+        ]) if len(vectors) else np.array([], dtype=np.int64)
+
+    def _insert(self, rows, assignments, lists=None):
+        lists = list(self.lists if lists is None else lists)
+        for c in np.unique(assignments):
+            lists[c] = np.concatenate([lists[c], rows[assignments == c]])
+        self.lists = lists
+
+class HNSWIndex(FlatIndex):
+    """Graph-based approximate search backed by the optional hnswlib package
+
+    ef_search trades recall for latency at query time; m and ef_construction
+    control graph quality and build time.
+    """
+
+    BUILD_SETTINGS = ('m', 'ef_construction')
+
+    def __init__(self, m=Config.HNSW_M, ef_construction=Config.HNSW_EF_CONSTRUCTION,
+                 ef_search=Config.HNSW_EF_SEARCH):
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("VECTOR_INDEX='hnsw' requires the hnswlib package")
+        super().__init__()
+        self._hnswlib = hnswlib
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.graph = None
+
+    def build(self, vectors):
+        graph = self._hnswlib.Index(space='ip', dim=vectors.shape[1])
+        graph.init_index(max_elements=max(len(vectors), 1), M=self.m,
+                         ef_construction=self.ef_construction)
+        graph.add_items(vectors, np.arange(len(vectors)))
+        self.graph = graph
+        self.vectors = vectors
+
+    def add(self, vectors):
+        if self.graph is None:
+            self.build(vectors)
+            return
+        start = len(self)
+        graph = self._copy_graph()
+        graph.resize_index(start + len(vectors))
+        graph.add_items(vectors, np.arange(start, start + len(vectors)))
+        super().add(vectors)
+        self.graph = graph
+
+    def update(self, rows, vectors):
+        graph = self._copy_graph()
+        # Re-adding an existing label updates its vector in place
+        graph.add_items(vectors, np.asarray(rows))
+        super().update(rows, vectors)
+        self.graph = graph
+
+    def _save(self, directory):
+        if self.graph is not None:
+            self.graph.save_index(os.path.join(directory, 'hnsw.bin'))
+
+    def _load(self, directory, vectors):
+        path = os.path.join(directory, 'hnsw.bin')
+        if not os.path.exists(path):
+            return False
+        graph = self._hnswlib.Index(space='ip', dim=vectors.shape[1])
+        graph.load_index(path, max_elements=max(len(vectors), 1))
+        if graph.get_current_count() != len(vectors):
+            return False
+        self.graph = graph
+        return True
+
+    def _copy_graph(self):
+        """A private copy of the graph to modify: indexes are shallow-copied
+        before incremental changes, and the state being served keeps
+        searching the original"""
+        return pickle.loads(pickle.dumps(self.graph))
+
+    def search(self, queries, k):
+        if self.graph is None or not len(self):
+            return super().search(queries, k)
+        count = min(k, len(self))
+        self.graph.set_ef(max(self.ef_search, count))
+        labels, distances = self.graph.knn_query(queries, k=count)
+        # Inner-product distance is 1 - similarity; results come back nearest first
+        indices = labels.astype(np.int64)
+        scores = (1.0 - distances).astype(np.float32)
+        if count < k:
+            pad = k - count
+            indices = np.pad(indices, ((0, 0), (0, pad)), constant_values=-1)
+            scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+        return indices, scores
+
+class QuantizedIndex(FlatIndex):
+    """Scores against a compact copy of the vectors, then reranks exactly
+
+    Vectors are optionally projected onto their top principal components and
+    stored as int8 (with a per-vector scale) or float16. A query is scored
+    against those codes and the best `rerank` candidates are rescored with
+    the full vectors. When the matcher serves a snapshot those are the
+    memory-mapped float32 embeddings shared by all workers, so the codes are
+    the only per-worker copy; otherwise a float16 copy is kept for reranking
+    instead of the float32 vectors the index was built from.
+    """
+
+    PRECISIONS = ('int8', 'float16')
+    # Rows used to fit the PCA projection
+    PCA_SAMPLE_SIZE = 20000
+
+    BUILD_SETTINGS = ('precision', 'pca_dimension', 'seed')
+
+    def __init__(self, precision=Config.EMBEDDING_PRECISION, pca_dimension=Config.EMBEDDING_PCA_DIM,
+                 rerank=Config.QUANTIZED_RERANK, seed=0):
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"Unknown embedding precision: {precision}")
+        super().__init__()
+        self.precision = precision
+        self.pca_dimension = pca_dimension
+        self.rerank = rerank
+        self.seed = seed
+        self.components = None
+        self.codes = None
+        self.scales = None
+
+    @property
+    def memory_bytes(self):
+        """Bytes held in this process's memory: the codes, plus the rerank
+        vectors unless they are memory-mapped"""
+        arrays = (self.codes, self.scales, self.components)
+        return sum(array.nbytes for array in arrays if array is not None) + self.rerank_bytes
+
+    @property
+    def rerank_bytes(self):
+        """Bytes of rerank vectors held in this process's memory"""
+        if self.vectors is None or self.vectors is self.codes or memory_mapped(self.vectors):
+            return 0
+        return self.vectors.nbytes
+
+    def build(self, vectors):
+        self.vectors = self._rerank_vectors(vectors)
+        self.components = None
+        if self.pca_dimension and self.pca_dimension < vectors.shape[1] and len(vectors) > 1:
+            self.components = self._fit_pca(vectors)
+        self.codes, self.scales = self._encode(vectors)
+        self._share_codes()
+
+    def add(self, vectors):
+        if self.codes is None:
+            self.build(vectors)
+            return
+        super().add(vectors)
+        self.vectors = self._rerank_vectors(self.vectors)
+        codes, scales = self._encode(vectors)
+        self.codes = np.vstack([self.codes, codes])
+        self.scales = None if scales is None else np.concatenate([self.scales, scales])
+        self._share_codes()
+
+    def update(self, rows, vectors):
+        super().update(rows, vectors)
+        self.vectors = self._rerank_vectors(self.vectors)
+        codes, scales = self._encode(vectors)
+        self.codes = self.codes.copy()
+        self.codes[rows] = codes
+        if scales is not None:
+            self.scales = self.scales.copy()
+            self.scales[rows] = scales
+        self._share_codes()
+
+    def search(self, queries, k):
+        vectors, codes, scales = self.vectors, self.codes, self.scales
+        if codes is None or not len(codes):
+            return super().search(queries, k)
+
+        projected = self._project(queries).astype(np.float32)
+        approximate = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK_SIZE):
+            chunk = codes[start:start + SCORE_CHUNK_SIZE].astype(np.float32)
+            approximate[:, start:start + len(chunk)] = projected @ chunk.T
+        if scales is not None:
+            approximate *= scales
+
+        candidates, approximate_scores = top_k(approximate, max(k, self.rerank))
+        if vectors is None:
+            return candidates[:, :k], approximate_scores[:, :k]
+
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            rows = candidates[i][candidates[i] >= 0]
+            exact_rows, exact_scores = top_k((vectors[rows].astype(np.float32) @ query)[None, :], k)
+            found = exact_rows[0] >= 0
+            indices[i, :found.sum()] = rows[exact_rows[0][found]]
+            scores[i, :found.sum()] = exact_scores[0][found]
+        return indices, scores
+
+    def _save(self, directory):
+        if self.codes is None:
+            return
+        np.save(os.path.join(directory, 'quantized_codes.npy'), self.codes)
+        if self.scales is not None:
+            np.save(os.path.join(directory, 'quantized_scales.npy'), self.scales)
+        if self.components is not None:
+            np.save(os.path.join(directory, 'quantized_components.npy'), self.components)
+
+    def _load(self, directory, vectors):
+        codes = np.load(os.path.join(directory, 'quantized_codes.npy'), mmap_mode='r')
+        if len(codes) != len(vectors):
+            return False
+        scales = components = None
+        if self.precision != 'float16':
+            scales = np.load(os.path.join(directory, 'quantized_scales.npy'), mmap_mode='r')
+        path = os.path.join(directory, 'quantized_components.npy')
+        if os.path.exists(path):
+            components = np.load(path)
+        self.codes, self.scales, self.components = codes, scales, components
+        return True
+
+    @staticmethod
+    def _rerank_vectors(vectors):
+        """Vectors to keep for reranking: memory-mapped ones as they are,
+        anything held in process memory as float16"""
+        if memory_mapped(vectors) or vectors.dtype == np.float16:
+            return vectors
+        return vectors.astype(np.float16)
+
+    def _share_codes(self):
+        # Unprojected float16 codes are the float16 rerank vectors; keep one copy
+        if self.precision == 'float16' and self.components is None and not memory_mapped(self.vectors):
+            self.vectors = self.codes
+
+    def _fit_pca(self, vectors):
+        """Top principal directions of a sample of the vectors
+
+        The projection is not centred: dropping the mean only shifts every
+        score of a query by the same amount, which does not change ranking.
+        """
+        rng = np.random.default_rng(self.seed)
+        size = min(len(vectors), self.PCA_SAMPLE_SIZE)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), size, replace=False))], dtype=np.float32)
+        sample = sample - sample.mean(axis=0)
+        _, _, components = np.linalg.svd(sample, full_matrices=False)
+        return np.ascontiguousarray(components[:self.pca_dimension], dtype=np.float32)
+
+    def _project(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors @ self.components.T if self.components is not None else vectors
+
+    def _encode(self, vectors):
+        """Compact codes (and int8 scales) for vectors, chunk by chunk"""
+        codes, scales = [], []
+        for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE):
+            chunk = self._project(vectors[start:start + ASSIGN_CHUNK_SIZE])
+            if self.precision == 'float16':
+                codes.append(chunk.astype(np.float16))
+                continue
+            scale = np.abs(chunk).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            codes.append(np.round(chunk / scale[:, None]).astype(np.int8))
+            scales.append(scale.astype(np.float32))
+        dimension = self.components.shape[0] if self.components is not None else vectors.shape[1]
+        dtype = np.float16 if self.precision == 'float16' else np.int8
+        codes = np.concatenate(codes) if codes else np.empty((0, dimension), dtype=dtype)
+        if self.precision == 'float16':
+            return codes, None
+        return codes, np.concatenate(scales) if scales else np.empty(0, dtype=np.float32)
+
+INDEX_TYPES = {
+    'flat': FlatIndex,
+    'ivf': IVFIndex,
+    'hnsw': HNSWIndex,
+    'quantized': QuantizedIndex,
+}
+
+def create_index(kind=Config.VECTOR_INDEX, **options):
+    """Build an empty vector index of the configured kind, passing options
+    to its constructor"""
+    try:
+        index_class = INDEX_TYPES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown vector index type: {kind}")
+    return index_class(**options)
@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_cache import AnswerCache
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = AnswerCache(max_entries=2, max_bytes=10 ** 6, ttl=60)
+    cache.put('a', {'response': 'A'}, 'v1')
+    cache.put('b', {'response': 'B'}, 'v1')
+    assert cache.get('a', 'v1') == {'response': 'A'}
+    cache.put('c', {'response': 'C'}, 'v1')
+
+    assert cache.get('b', 'v1') is None
+    assert cache.get('a', 'v1') and cache.get('c', 'v1')
+    assert cache.stats()['evictions'] == 1
+
+def test_byte_budget_evicts_and_skips_oversized_answers():
+    cache = AnswerCache(max_entries=100, max_bytes=2000, ttl=60)
+    cache.put('huge', 'x' * 5000, 'v1')
+    assert cache.get('huge', 'v1') is None and cache.stats()['entries'] == 0
+
+    for i in range(20):
+        cache.put(f'q{i}', 'x' * 200, 'v1')
+    stats = cache.stats()
+    assert stats['bytes'] <= 2000 and stats['evictions'] > 0
+    assert cache.get('q19', 'v1') == 'x' * 200
+    assert cache.get('q0', 'v1') is None
+
+def test_expired_entries_are_misses():
+    cache = AnswerCache(max_entries=10, max_bytes=10 ** 6, ttl=-1)
+    cache.put('a', 'A', 'v1')
+    assert cache.get('a', 'v1') is None
+    assert cache.stats()['entries'] == 0 and cache.stats()['bytes'] == 0
+
+def test_new_corpus_version_invalidates_every_entry():
+    cache = AnswerCache(max_entries=10, max_bytes=10 ** 6, ttl=60)
+    cache.put('a', 'A', 'v1')
+    cache.put('b', 'B', 'v1')
+
+    assert cache.get('a', 'v2') is None
+    stats = cache.stats()
+    assert stats['entries'] == 0 and stats['bytes'] == 0 and stats['version'] == 'v2'
+    # Nothing computed against the old corpus comes back either
+    assert cache.get('b', 'v1') is None
@@ -0,0 +1,45 @@
+import base64
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import load_chat_app
+
+@pytest.fixture(scope='module')
+def chat_app(tmp_path_factory):
+    # Importing app.py fits a matcher; keep its snapshot directory out of the tree
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    try:
+        yield load_chat_app()
+    finally:
+        os.chdir(cwd)
+
+def token(raw):
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def test_cursor_round_trips(chat_app):
+    position = ['2026-01-05 12:00:00', 42]
+    assert chat_app.decode_cursor(chat_app.encode_cursor(position), (str, int)) == position
+
+@pytest.mark.parametrize('cursor', [
+    '!!not base64!!',
+    token(b'\xff\xfe'),            # not UTF-8
+    token(b'{"id": 5}'),           # not a list
+    token(b'[5, 6]'),              # wrong length
+    token(b'["5"]'),               # wrong type
+    token(b'[5.5]'),
+    token(b'[true]'),              # bool is an int subclass
+    token(b'[null]'),
+])
+def test_malformed_cursors_are_rejected(chat_app, cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        chat_app.decode_cursor(cursor, (int,))
+
+def test_faqs_answers_400_for_a_bad_cursor(chat_app):
+    response = chat_app.app.test_client().get('/faqs?cursor=' + token(b'[true]'))
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
@@ -0,0 +1,38 @@
+import os
+import sys
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.batching import EncodeBatcher
+
+def encode(texts):
+    return np.array([[len(text), 1.0] for text in texts])
+
+def test_worker_starts_on_first_submit():
+    batcher = EncodeBatcher(encode, max_wait_ms=1)
+    assert batcher._worker is None
+    assert np.array_equal(batcher.encode(['ab', 'abc']), encode(['ab', 'abc']))
+    assert batcher._worker_pid == os.getpid() and batcher.encoded == 2
+    batcher.close()
+
+def test_timed_out_encode_falls_back_to_a_direct_encode():
+    stalled_on, release = threading.Event(), threading.Event()
+
+    def stalled(texts):
+        if threading.current_thread().name == 'encode-batcher':
+            stalled_on.set()
+            release.wait(5)
+        return encode(texts)
+
+    batcher = EncodeBatcher(stalled, max_wait_ms=1, timeout_ms=50)
+    first = batcher.submit('held up')
+    stalled_on.wait(5)
+    assert np.array_equal(batcher.encode(['ab', 'abc']), encode(['ab', 'abc']))
+    assert batcher.timeouts == 1
+    release.set()
+    assert np.array_equal(first.result(5), encode(['held up'])[0])
+    batcher.close()
+    # The withdrawn texts were never encoded by the worker
+    assert batcher.encoded == 1
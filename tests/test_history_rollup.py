@@ -0,0 +1,33 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_rollup import ChatHistoryRollup, summarize
+
+def row(row_id, confidence, matched_faq_id=None, message='How do I apply?'):
+    return {'id': row_id, 'user_message': message, 'confidence_score': confidence,
+            'matched_faq_id': matched_faq_id, 'created_at': datetime(2026, 1, 5, 12)}
+
+def test_only_legacy_rows_are_classified_by_score():
+    rows = [
+        row(1, 0.9),                     # before matched_faq_id was recorded
+        row(2, 0.9),                     # fallback answer despite a high score
+        row(3, 0.2, matched_faq_id=7),
+    ]
+    daily = summarize(rows, legacy_id=1)['daily']
+    assert daily == [(datetime(2026, 1, 5).date(), 3, 2, 2.0)]
+
+def test_thread_starts_on_first_start_in_each_process():
+    rollup = ChatHistoryRollup(None, interval=3600)
+    assert rollup._worker is None
+    rollup.start()
+    worker = rollup._worker
+    rollup.start()
+    assert rollup._worker is worker and worker.is_alive()
+    rollup.close()
+    assert not worker.is_alive()
+    disabled = ChatHistoryRollup(None, interval=0)
+    disabled.start()
+    assert disabled._worker is None
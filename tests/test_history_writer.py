@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_writer import ChatHistoryWriter
+
+class FakeDatabase:
+    def __init__(self):
+        self.available = True
+        self.rows = []
+
+    def save_chat_history_batch(self, rows):
+        if not self.available:
+            return None
+        self.rows.extend(rows)
+        return len(rows)
+
+def test_spill_files_are_per_process_and_orphans_are_replayed(tmp_path):
+    spill_path = str(tmp_path / 'spill.jsonl')
+    # Left behind by a worker that has exited
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                            capture_output=True, text=True).stdout.strip()
+    for suffix, question in (('', 'orphaned'), ('.adopting', 'adopting'), ('.replaying', 'replaying')):
+        with open(f'{spill_path}.{exited}{suffix}', 'w', encoding='utf-8') as f:
+            f.write(json.dumps([question, 'answer', 0.5, 3]) + '\n')
+
+    db = FakeDatabase()
+    db.available = False
+    writer = ChatHistoryWriter(db, flush_interval=0.01, overflow='spill', spill_path=spill_path)
+    writer.submit('spilled', 'answer', 0.9, 1)
+    writer.close()
+    assert os.path.exists(f'{spill_path}.{os.getpid()}')
+
+    db.available = True
+    writer = ChatHistoryWriter(db, flush_interval=0.01, overflow='spill', spill_path=spill_path)
+    writer.start()
+    writer.close()
+    assert sorted(row[0] for row in db.rows) == ['adopting', 'orphaned', 'replaying', 'spilled']
+    assert os.listdir(tmp_path) == []
+
+def test_replay_writes_in_batches_without_holding_the_spill_lock(tmp_path):
+    spill_path = str(tmp_path / 'spill.jsonl')
+    with open(f'{spill_path}.{os.getpid()}', 'w', encoding='utf-8') as f:
+        for i in range(5):
+            f.write(json.dumps([f'question {i}', 'answer', 0.5, i]) + '\n')
+
+    class FlakyDatabase(FakeDatabase):
+        calls = 0
+        writer = None
+        ready = threading.Event()
+
+        def save_chat_history_batch(self, rows):
+            # Requests spilling during a replay must not wait on the database
+            self.ready.wait(5)
+            assert not self.writer._spill_lock.locked()
+            self.calls += 1
+            if self.calls == 2:
+                return None
+            return super().save_chat_history_batch(rows)
+
+    db = FlakyDatabase()
+    for expected in (2, 5):
+        db.ready.clear()
+        db.writer = ChatHistoryWriter(db, batch_size=2, flush_interval=0.01, overflow='spill',
+                                      spill_path=spill_path)
+        db.writer.start()
+        db.ready.set()
+        db.writer.close()
+        assert [row[0] for row in db.rows] == [f'question {i}' for i in range(expected)]
+    assert os.listdir(tmp_path) == []
+
+def test_thread_starts_on_first_submit_in_each_process(tmp_path):
+    db = FakeDatabase()
+    writer = ChatHistoryWriter(db, flush_interval=0.01)
+    assert writer._worker is None
+
+    # A forked worker starts its own thread rather than relying on the parent's
+    writer._worker_pid = -1
+    writer.submit('question', 'answer', 0.9, 1)
+    assert writer._worker.is_alive() and writer._worker_pid == os.getpid()
+    writer.close()
+    assert db.rows == [('question', 'answer', 0.9, 1)]
@@ -0,0 +1,190 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.encoder import HashingEncoder
+from benchmarks.sqlite_db import SQLiteDatabase
+from models.nlp_model import FAQMatcher
+
+def fitted_matcher(size=300):
+    db = SQLiteDatabase()
+    db.load_faqs(generate_corpus(size))
+    matcher = FAQMatcher(db, snapshot_dir=None, sentence_model=HashingEncoder(), batch_encodes=False)
+    matcher.fit()
+    return db, matcher
+
+def test_adding_faq_with_known_words_does_not_refit():
+    db, matcher = fitted_matcher()
+    last_full_fit = matcher.last_full_fit
+
+    def refit():
+        raise AssertionError('incremental add fell back to a full fit')
+    matcher._fit = refit
+
+    # Every word is in the vocabulary, but the word pairs are new
+    question = 'Where can I pay the transcript for hospitality?'
+    faq_id = db.insert_faq(question, 'At the bursary.', 'Fees')
+    matcher.add_faqs([{'id': faq_id, 'question': question, 'answer': 'At the bursary.', 'category': 'Fees'}])
+
+    assert matcher.last_full_fit == last_full_fit
+    assert matcher._unseen_tokens / matcher._indexed_tokens <= matcher.drift_threshold
+    best, _ = matcher.find_best_match(question, 'tfidf')
+    assert best['id'] == faq_id
+
+def test_adding_faq_with_unknown_words_refits():
+    db, matcher = fitted_matcher()
+    question = 'Quidditch broomstick licensing waivers?'
+    faq_id = db.insert_faq(question, 'Ask the registry.', 'Sports')
+    matcher.add_faqs([{'id': faq_id, 'question': question, 'answer': 'Ask the registry.', 'category': 'Sports'}])
+
+    assert matcher._indexed_tokens == 0
+    assert 'quidditch' in matcher.vectorizer.vocabulary_
+
+def test_category_partitions_match_filtered_results():
+    db, matcher = fitted_matcher()
+    state = matcher.state
+    # FAQs load ordered by category, so a category's rows start out contiguous
+    categories = sorted(state.category_rows)[:3:2]
+    single = state.partition(categories[:1])
+    assert np.shares_memory(single.tfidf_matrix.data, state.tfidf_matrix.data)
+    assert np.shares_memory(single.embedding_matrix, state.embedding_matrix)
+    group = state.partition(categories)
+    assert [partition.index is not state.index for partition in group.partitions] == [True, True]
+
+    questions = [faq['question'] for faq in state.faq_data[::15]]
+    everything = len(state.faq_data)
+    for method in ('tfidf', 'semantic'):
+        scoped = matcher.find_best_matches(questions, method, top_k=5, categories=categories)
+        unscoped = matcher.find_best_matches(questions, method, top_k=everything)
+        for candidates, all_candidates in zip(scoped, unscoped):
+            expected = [(faq, score) for faq, score in all_candidates if faq and faq['category'] in categories][:5]
+            answered = [(faq, score) for faq, score in candidates if faq]
+            # Tied scores may come back in either order
+            np.testing.assert_allclose([score for _, score in answered], [score for _, score in expected], rtol=1e-5)
+            assert answered[:1] == expected[:1] or answered[0][1] == pytest.approx(expected[0][1])
+    for method in ('hybrid', 'cascade'):
+        for candidates in matcher.find_best_matches(questions, method, top_k=3, categories=categories):
+            assert all(faq is None or faq['category'] in categories for faq, _ in candidates)
+
+def test_incremental_add_rebuilds_only_the_edited_category():
+    db, matcher = fitted_matcher()
+    partitions = dict(matcher.state._partitions)
+    question = 'Where can I pay the transcript for hospitality?'
+    faq_id = db.insert_faq(question, 'At the bursary.', 'Fees')
+    matcher.add_faqs([{'id': faq_id, 'question': question, 'answer': 'At the bursary.', 'category': 'Fees'}])
+
+    rebuilt = [category for category, partition in matcher.state._partitions.items()
+               if partition is not partitions.get(category)]
+    assert rebuilt == ['Fees']
+    assert matcher.find_best_match(question, 'tfidf', categories='Fees')[0]['id'] == faq_id
+
+def test_loading_snapshot_keeps_drift_counts(tmp_path):
+    db = SQLiteDatabase()
+    db.load_faqs(generate_corpus(300))
+    matcher = FAQMatcher(db, snapshot_dir=str(tmp_path), sentence_model=HashingEncoder(), batch_encodes=False)
+    matcher.fit()
+    question = 'Where can I pay the transcript for hospitality?'
+    faq_id = db.insert_faq(question, 'At the bursary.', 'Fees')
+    matcher.add_faqs([{'id': faq_id, 'question': question, 'answer': 'At the bursary.', 'category': 'Fees'}])
+    assert matcher._indexed_tokens
+
+    # A restarted worker loads the published generation instead of fitting
+    restarted = FAQMatcher(db, snapshot_dir=str(tmp_path), sentence_model=HashingEncoder(), batch_encodes=False)
+    restarted.fit()
+    assert restarted.last_full_fit == matcher.last_full_fit
+    assert restarted._indexed_tokens == matcher._indexed_tokens
+    assert restarted._unseen_tokens == matcher._unseen_tokens
+
+def test_refresh_swaps_generation_in_background(tmp_path):
+    db = SQLiteDatabase()
+    db.load_faqs(generate_corpus(300))
+    publisher = FAQMatcher(db, snapshot_dir=str(tmp_path), sentence_model=HashingEncoder(), batch_encodes=False)
+    publisher.fit()
+    reader = FAQMatcher(db, snapshot_dir=str(tmp_path), sentence_model=HashingEncoder(), batch_encodes=False,
+                        snapshot_check_interval=0)
+    reader.fit()
+
+    question = 'Where can I pay the transcript for hospitality?'
+    faq_id = db.insert_faq(question, 'At the bursary.', 'Fees')
+    publisher.add_faqs([{'id': faq_id, 'question': question, 'answer': 'At the bursary.', 'category': 'Fees'}])
+
+    assert reader.refresh() is False
+    with reader._refresh_lock:
+        pass
+    assert reader.state.generation == publisher.state.generation
+
+def test_failed_publish_keeps_serving_the_published_generation(tmp_path, monkeypatch):
+    db = SQLiteDatabase()
+    db.load_faqs(generate_corpus(300))
+    matcher = FAQMatcher(db, snapshot_dir=str(tmp_path), sentence_model=HashingEncoder(), batch_encodes=False)
+    matcher.fit()
+    generation = matcher.state.generation
+
+    def unwritable(*args, **kwargs):
+        raise OSError('read-only file system')
+    monkeypatch.setattr('models.nlp_model.publish_snapshot', unwritable)
+    question = 'Where can I pay the transcript for hospitality?'
+    faq_id = db.insert_faq(question, 'At the bursary.', 'Fees')
+    with pytest.raises(OSError):
+        matcher.add_faqs([{'id': faq_id, 'question': question, 'answer': 'At the bursary.', 'category': 'Fees'}])
+    assert matcher.state.generation == generation
+
+@pytest.mark.parametrize('index_type', ['ivf', 'hnsw', 'quantized'])
+def test_loading_snapshot_reuses_saved_index(tmp_path, monkeypatch, index_type):
+    db = SQLiteDatabase()
+    db.load_faqs(generate_corpus(300))
+    renderer = lambda answer: '<p>%s</p>' % answer
+    matcher = FAQMatcher(db, snapshot_dir=str(tmp_path), sentence_model=HashingEncoder(), batch_encodes=False,
+                         index_type=index_type, renderer=renderer)
+    matcher.fit()
+    question = 'How do I pay the acceptance fee?'
+    expected = [score for faq, score in matcher.find_best_matches([question], 'semantic', top_k=5)[0]]
+
+    # The restarted worker must not rebuild the index, re-render or re-hash
+    def rebuilt(*args, **kwargs):
+        raise AssertionError('rebuilt from the FAQs')
+    restarted = FAQMatcher(db, snapshot_dir=str(tmp_path), sentence_model=HashingEncoder(), batch_encodes=False,
+                           index_type=index_type, renderer=renderer)
+    monkeypatch.setattr(type(restarted.state.index), 'build', rebuilt)
+    monkeypatch.setattr(restarted, '_render_answers', rebuilt)
+    monkeypatch.setattr('models.nlp_model.content_hash', rebuilt)
+    restarted.fit()
+    assert restarted.state.generation == matcher.state.generation
+    assert restarted.rendered_answers == matcher.rendered_answers
+    assert restarted.state.content_hashes == matcher.state.content_hashes
+    scores = [score for faq, score in restarted.find_best_matches([question], 'semantic', top_k=5)[0]]
+    assert np.allclose(scores, expected)
+
+def test_cascade_answers_confident_tfidf_matches_without_encoding(monkeypatch):
+    db, matcher = fitted_matcher()
+    faq = matcher.faq_data[0]
+
+    def encode(*args, **kwargs):
+        raise AssertionError('an early exit was encoded')
+    monkeypatch.setattr(matcher.sentence_model, 'encode', encode)
+    [(found, score)] = matcher.find_best_matches([faq['question']], 'cascade')[0]
+    assert found['id'] == faq['id'] and score >= matcher.cascade_early_exit
+
+@pytest.mark.parametrize('fusion, order', [('weighted', [11, 12, 10]), ('rrf', [11, 10, 12])])
+def test_cascade_fusion_orders_the_shortlist(fusion, order):
+    _, matcher = fitted_matcher()
+    matcher.cascade_fusion = fusion
+    matcher.cascade_semantic_weight = 0.6
+    rows = np.array([10, 11, 12])
+    fused = matcher._fuse(rows, np.array([0.6, 0.5, 0.4]), np.array([0.1, 0.9, 0.5]), 3)
+    assert [row for row, _ in fused] == order
+    # Whatever decides the order, the confidence is the weighted score
+    confidence = {10: 0.3, 11: 0.74, 12: 0.46}
+    assert np.allclose([score for _, score in fused], [confidence[row] for row in order])
+
+def test_cascade_without_lexical_overlap_falls_back_to_semantic_search():
+    _, matcher = fitted_matcher()
+    question = 'zqxv wvbk'
+    semantic = matcher.find_best_matches([question], 'semantic', top_k=3)[0]
+    cascade = matcher.find_best_matches([question], 'cascade', top_k=3)[0]
+    assert np.allclose([score for _, score in cascade],
+                       [score * matcher.cascade_semantic_weight for _, score in semantic])
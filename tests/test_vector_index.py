@@ -0,0 +1,105 @@
+import copy
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.vector_index import FlatIndex, create_index, top_k
+
+def normalized(count, dimension=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def clustered(count, dimension=32, clusters=40, seed=0):
+    """Normalized vectors around a few centres, like embeddings of FAQs on a
+    handful of topics"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dimension))
+    vectors = centres[rng.integers(clusters, size=count)] + 0.3 * rng.normal(size=(count, dimension))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_top_k_pads_rows_with_fewer_than_k_candidates():
+    indices, scores = top_k(np.array([[0.2, 0.9, 0.5], [0.1, 0.1, 0.3]], dtype=np.float32), 5)
+    np.testing.assert_array_equal(indices, [[1, 2, 0, -1, -1], [2, 0, 1, -1, -1]])
+    np.testing.assert_allclose(scores[:, :3], [[0.9, 0.5, 0.2], [0.3, 0.1, 0.1]])
+    assert np.isneginf(scores[:, 3:]).all()
+
+    indices, scores = top_k(np.empty((2, 0), dtype=np.float32), 2)
+    assert (indices == -1).all() and np.isneginf(scores).all()
+
+def test_top_k_keeps_the_lowest_row_on_ties():
+    scores = np.array([[0.4, 0.7, 0.7, 0.1]], dtype=np.float32)
+    assert top_k(scores, 1)[0].tolist() == [[1]]
+    assert top_k(scores, 2)[0].tolist() == [[1, 2]]
+
+@pytest.mark.parametrize('kind', ['flat', 'ivf', 'hnsw', 'quantized'])
+def test_search_pads_when_the_index_holds_fewer_than_k(kind):
+    if kind == 'hnsw':
+        pytest.importorskip('hnswlib')
+    vectors = normalized(3)
+    index = create_index(kind)
+    index.build(vectors)
+    indices, scores = index.search(vectors[:2], 5)
+    assert indices.shape == scores.shape == (2, 5)
+    assert sorted(indices[0, :3]) == [0, 1, 2] and indices[0, 0] == 0
+    assert (indices[:, 3:] == -1).all() and np.isneginf(scores[:, 3:]).all()
+
+@pytest.mark.parametrize('kind', ['ivf', 'hnsw', 'quantized'])
+def test_approximate_search_recalls_the_exact_neighbours(kind):
+    if kind == 'hnsw':
+        pytest.importorskip('hnswlib')
+    vectors = clustered(3000)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), 100, replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = FlatIndex()
+    exact.build(vectors)
+    expected, _ = exact.search(queries, 10)
+    index = create_index(kind)
+    index.build(vectors)
+    found, _ = index.search(queries, 10)
+
+    assert np.mean(found[:, 0] == expected[:, 0]) >= 0.95
+    assert np.mean([len(set(a) & set(b)) / 10 for a, b in zip(found, expected)]) >= 0.95
+
+@pytest.mark.parametrize('kind', ['flat', 'ivf', 'hnsw', 'quantized'])
+def test_changing_a_copy_leaves_the_original_index_alone(kind):
+    if kind == 'hnsw':
+        pytest.importorskip('hnswlib')
+    vectors = normalized(200)
+    index = create_index(kind)
+    index.build(vectors)
+    before = index.search(vectors[:10], 5)
+
+    changed = copy.copy(index)
+    changed.add(normalized(20, seed=1))
+    changed.update([0, 1, 2], normalized(3, seed=2))
+
+    assert len(index) == 200 and len(changed) == 220
+    after = index.search(vectors[:10], 5)
+    np.testing.assert_array_equal(before[0], after[0])
+    np.testing.assert_allclose(before[1], after[1])
+
+@pytest.mark.parametrize('precision', ['int8', 'float16'])
+def test_quantized_index_keeps_no_float32_vectors(tmp_path, precision):
+    vectors = normalized(200)
+    index = create_index('quantized', precision=precision)
+    index.build(vectors)
+    assert index.vectors.dtype == np.float16
+    # Without PCA the float16 codes double as the rerank vectors
+    assert index.rerank_bytes == (0 if precision == 'float16' else vectors.nbytes // 2)
+
+    # Served from a snapshot, reranking reads the memory-mapped embeddings
+    np.save(tmp_path / 'embeddings.npy', vectors)
+    mapped = np.load(tmp_path / 'embeddings.npy', mmap_mode='r')
+    index.save(str(tmp_path / 'index'))
+    loaded = create_index('quantized', precision=precision)
+    assert loaded.load(str(tmp_path / 'index'), mapped)
+    assert loaded.rerank_bytes == 0
+    np.testing.assert_array_equal(loaded.search(vectors[:10], 5)[0], index.search(vectors[:10], 5)[0])